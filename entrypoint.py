@@ -10,26 +10,77 @@ import os
 import shutil
 import logging
 import logging.config
+import logging.handlers
 import yaml
 import re
+import json
+import hashlib
+import tempfile
+import csv
+import sqlite3
+import gzip
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from html import escape
+from html.parser import HTMLParser
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from importlib.metadata import version, PackageNotFoundError
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from threading import Thread
+from typing import NamedTuple
 from dotenv import load_dotenv
-from pathlib import Path
-import bs4
-from jinja2 import Environment, FileSystemLoader, BaseLoader
-from pysubyt import JinjaBasedGenerator, SourceFactory, SinkFactory, GeneratorSettings
+from jinja2 import (
+    Environment,
+    FileSystemLoader,
+    FileSystemBytecodeCache,
+    BaseLoader,
+    Template,
+)
+from pysubyt import JinjaBasedGenerator
+from rdflib import BNode, Graph, Literal, URIRef
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+try:
+    import brotli
+except ImportError:  # optional, only gzip siblings are written without it
+    brotli = None
+import pylode
 from pylode import OntPub, PylodeError, __version__ as plv
 from pylode import (
     DCTERMS,
     OWL,
     PROF,
     RDF,
+    RDFS,
     SKOS,
 )
-from itertools import chain
+from rdflib import BNode, Literal, URIRef
 
 log = logging.getLogger("pylode-to-pages")
 
+# stylesheet shipped with pylode, copied from there rather than from the outfolder
+# so concurrent workers never read a pylode.css that another one is rewriting
+PYLODE_CSS = Path(pylode.__file__).parent / "pylode.css"
+PYLODE_CSS_LINK = '<link href="{href}" rel="stylesheet" type="text/css">'
+PYLODE_STYLE = re.compile(r"<style>.*?</style>", re.DOTALL)
+
+# manifest of the previous build, kept in the outfolder to allow incremental rebuilds
+MANIFEST_NAME = ".pylode-to-pages-manifest.json"
+TIMINGS_NAME = ".pylode-to-pages-timings.json"
+SEARCH_FOLDER = ".pylode-to-pages-search"
+SEARCH_INDEX_NAME = "search-index.json"
+BUILD_STATS = ("timings", "memory", "outputs")
+VOCAB_TEMPLATES = ("template_html.html", "template_ttl.ttl")
+VOCAB_PAGE_SIZE = 1000  # concepts per page of a vocabulary too large for one
+VOCAB_STREAM_SIZE = 64 * 1024 * 1024  # bytes of csv above which its rows are streamed
+
 EMBEDDED_YAML_LOGCONF = """
 version: 1
 formatters:
@@ -64,28 +115,1133 @@ def enable_logging(logconf):
         )
 
 
+# process-wide template registry, every template folder gets one environment
+# (and so compiles each of its templates once), optionally backed by an
+# on-disk bytecode cache that survives between runs
+_template_cache = None
+_template_envs = dict()
+_vocab_generators = dict()
+
+
+def use_template_cache(cache_folder=None):
+    """Keep the compiled templates of the action in a persistent cache folder.
+
+    Args:
+        cache_folder (str): folder for the jinja bytecode cache, None or "" disables it
+    """
+    global _template_cache
+    if cache_folder:
+        os.makedirs(cache_folder, exist_ok=True)
+        _template_cache = FileSystemBytecodeCache(str(cache_folder))
+    else:
+        _template_cache = None
+    # environments made before were made with the previous cache
+    _template_envs.clear()
+    _vocab_generators.clear()
+
+
+def template_cache_folder():
+    """Return the folder of the bytecode cache in use, None if there is none."""
+    return None if _template_cache is None else _template_cache.directory
+
+
+def template_environment(template_path, cached=True):
+    """Return the jinja environment for a template folder, creating it once per process.
+
+    Args:
+        template_path (str): folder holding the templates
+        cached (bool): keep the compiled templates in memory and in the bytecode
+            cache (if one is configured), False for templates rendered only once
+
+    Returns:
+        Environment: the environment shared by every render from that folder
+    """
+    key = (str(template_path), cached)
+    if key not in _template_envs:
+        if cached:
+            _template_envs[key] = Environment(
+                loader=FileSystemLoader(str(template_path)),
+                bytecode_cache=_template_cache,
+            )
+        else:
+            _template_envs[key] = Environment(
+                loader=FileSystemLoader(str(template_path)), cache_size=0
+            )
+    return _template_envs[key]
+
+
+def get_template(template_path, template_name):
+    """Return a compiled template from the registry."""
+    return template_environment(template_path).get_template(template_name)
+
+
+def vocab_generator(template_path):
+    """Return the pysubyt generator for a template folder, creating it once per process.
+
+    Args:
+        template_path (str): folder holding the vocabulary templates
+
+    Returns:
+        JinjaBasedGenerator: the generator shared by every vocabulary run
+    """
+    key = str(template_path)
+    if key not in _vocab_generators:
+        generator = JinjaBasedGenerator(key)
+        # pysubyt sets up its own environment and keeps it private (hence the
+        # pinned version in requirements.txt), share the bytecode cache with it
+        builder = getattr(generator, "syntax_builder", None)
+        environment = getattr(builder, "_templates_env", None)
+        if isinstance(environment, Environment):
+            environment.bytecode_cache = _template_cache
+        elif _template_cache is not None:
+            log.error(
+                f"pysubyt {package_version('pysubyt')} does not expose the jinja "
+                "environment of its generator, the vocabulary templates are "
+                "compiled without the template cache"
+            )
+        _vocab_generators[key] = generator
+    return _vocab_generators[key]
+
+
+GRAPH_CACHE_SIZE = 512  # MB
+
+
+class GraphCache:
+    """Folder of parsed ontology graphs, stored to skip the turtle parsing next time.
+
+    The entries are keyed by the hash of the rendered ttl, its base IRI and the
+    rdflib version, and evicted least recently used first once the folder
+    grows beyond its maximum size. They are plain json data, the terms of the
+    graph listed once and the triples as indexes into that list, so loading a
+    cache that is shared or restored on CI never runs any code from it.
+    """
+
+    def __init__(self, folder, max_size=GRAPH_CACHE_SIZE):
+        self.folder = Path(folder)
+        self.max_size = int(max_size)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def key(self, text, public_id):
+        digest = hashlib.sha256()
+        digest.update(f"{package_version('rdflib')}\n{public_id}\n".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key):
+        path = self.folder / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as graph_file:
+                graph = graph_from_data(json.load(graph_file))
+            # mark it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.warning(f"ignoring unreadable cached graph '{path}': {e}")
+            return None
+        return graph
+
+    def save(self, key, data):
+        # write aside and move in place, other workers may be reading the folder
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.folder, suffix=".tmp", encoding="utf-8", delete=False
+        ) as graph_file:
+            json.dump(data, graph_file, separators=(",", ":"))
+        os.replace(graph_file.name, self.folder / f"{key}.json")
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for path in self.folder.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size * 1024 * 1024:
+                break
+            try:
+                path.unlink()
+                log.debug(f"evicted cached graph '{path.name}'")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _term_data(term):
+    if isinstance(term, Literal):
+        datatype = None if term.datatype is None else str(term.datatype)
+        return ["l", str(term), datatype, term.language]
+    return ["b" if isinstance(term, BNode) else "u", str(term)]
+
+
+def _data_term(data):
+    if data[0] == "l":
+        return Literal(data[1], lang=data[3], datatype=data[2])
+    return BNode(data[1]) if data[0] == "b" else URIRef(data[1])
+
+
+def graph_data(graph):
+    """Describe a graph as json data, for the graph cache.
+
+    Args:
+        graph (Graph): the parsed ontology
+
+    Returns:
+        dict: the identifier, namespace bindings, terms and triples of the graph,
+            each triple as three indexes into the terms, in sorted order
+    """
+    terms, indexes, triples = [], dict(), []
+    for triple in sorted(graph):
+        for term in triple:
+            index = indexes.get(term)
+            if index is None:
+                index = indexes[term] = len(terms)
+                terms.append(_term_data(term))
+            triples.append(index)
+    return dict(
+        identifier=_term_data(graph.identifier),
+        namespaces=[[prefix, str(ns)] for prefix, ns in graph.namespaces()],
+        terms=terms,
+        triples=triples,
+    )
+
+
+def graph_from_data(data):
+    """Rebuild the graph described by graph_data, with its namespace bindings as they were."""
+    graph = Graph(identifier=_data_term(data["identifier"]), bind_namespaces="none")
+    for prefix, ns in data["namespaces"]:
+        graph.store.bind(prefix, URIRef(ns))
+    terms = [_data_term(term) for term in data["terms"]]
+    triples = data["triples"]
+    graph.addN(
+        (terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]], graph)
+        for i in range(0, len(triples), 3)
+    )
+    return graph
+
+
+_graph_cache = None
+
+
+def use_graph_cache(cache_folder=None, max_size=None):
+    """Keep the parsed ontology graphs in a persistent cache folder.
+
+    Args:
+        cache_folder (str): folder for the cached graphs, None or "" disables it
+        max_size (int): size in MB the folder is kept under, None or "" for the default
+    """
+    global _graph_cache
+    if cache_folder:
+        max_size = GRAPH_CACHE_SIZE if max_size in (None, "") else max_size
+        _graph_cache = GraphCache(cache_folder, max_size)
+    else:
+        _graph_cache = None
+
+
+def graph_cache_settings():
+    """Return the (folder, max_size) of the graph cache in use, (None, None) if there is none."""
+    if _graph_cache is None:
+        return None, None
+    return str(_graph_cache.folder), _graph_cache.max_size
+
+
+# the turtle parser numbers the blank nodes it meets: <random id>b<number>
+BNODE_SERIAL = re.compile(r"b(\d+)$")
+
+
+def parse_serial(node):
+    """Sort key putting the blank nodes of a parsed graph in the order they were parsed in."""
+    match = BNODE_SERIAL.search(node)
+    return (int(match.group(1)) if match else -1, str(node))
+
+
+def label_blank_nodes(graph, prefix="b"):
+    """Relabel the blank nodes of a parsed graph in the order they were parsed in.
+
+    The parser labels blank nodes at random, which ends up in the pylode html
+    (and the N-Triples export); with these labels the same ontology always gives
+    the same page.
+
+    Args:
+        graph (Graph): the parsed graph, relabelled in place
+        prefix (str): the start of the labels, followed by a counter
+    """
+    blank = [
+        triple
+        for triple in graph
+        if isinstance(triple[0], BNode) or isinstance(triple[2], BNode)
+    ]
+    nodes = {node for triple in blank for node in triple if isinstance(node, BNode)}
+    labels = {
+        node: BNode(f"{prefix}{index}")
+        for index, node in enumerate(sorted(nodes, key=parse_serial))
+    }
+    for triple in blank:
+        graph.remove(triple)
+    for subject, predicate, obj in blank:
+        graph.add((labels.get(subject, subject), predicate, labels.get(obj, obj)))
+
+
+def parse_ontology(text, public_id):
+    """Parse a rendered ontology, or load its graph from the graph cache.
+
+    Args:
+        text (str): the rendered ttl
+        public_id (str): base IRI to resolve relative IRIs against
+
+    Returns:
+        Graph: the parsed ontology
+    """
+    key = None
+    if _graph_cache is not None:
+        key = _graph_cache.key(text, public_id)
+        graph = _graph_cache.load(key)
+        if graph is not None:
+            log.debug(f"graph of '{public_id}' loaded from the graph cache")
+            return graph
+    graph = Graph(bind_namespaces="core").parse(
+        data=text, format="turtle", publicID=public_id
+    )
+    label_blank_nodes(graph)
+    if _graph_cache is None:
+        return graph
+    # pylode lists some entities in the order of the triples: hand out the graph
+    # as the cache will give it back next time, so both render the same page
+    data = graph_data(graph)
+    _graph_cache.save(key, data)
+    return graph_from_data(data)
+
+
+PUB_TYPES = (OWL.Ontology, PROF.Profile, SKOS.ConceptScheme)
+TEMPLATE_MARKERS = re.compile(r"{{|{%|{#")
+
+
+def pylode_html(od: OntPub, stylesheet="pylode.css"):
+    """Make the html page of an ontology, linking the pylode stylesheet.
+
+    pylode only links its stylesheet when it writes the page itself, copying the
+    stylesheet next to it every time. The page is made in memory instead, with
+    the inlined stylesheet swapped for the link pylode would have written.
+    Should the head of the page hold no stylesheet to swap, the page is kept as
+    pylode made it, which is logged.
+
+    Args:
+        od: the pylode OntPub of the ontology
+        stylesheet: the href of the stylesheet, relative to the page
+    """
+    html = od.make_html(include_css=True)
+    head_end = max(html.find("</head>"), 0)
+    link = PYLODE_CSS_LINK.format(href=stylesheet)
+    head, swapped = PYLODE_STYLE.subn(lambda style: link, html[:head_end], count=1)
+    if not swapped:
+        log.warning(
+            f"no inlined stylesheet in the head of the pylode {plv} page, "
+            "keeping it instead of linking the shared pylode.css"
+        )
+        return html
+    return head + html[head_end:]
+
+
 def extract_pub_dict(od: OntPub):
-    def ont_prop(ont, predicate):
-        value = None
-        for s in chain(
-            ont.subjects(RDF.type, OWL.Ontology),
-            ont.subjects(RDF.type, PROF.Profile),
-            ont.subjects(RDF.type, SKOS.ConceptScheme),
-        ):
-            for obj in ont.objects(s, predicate):
-                value = str(obj)
-        return value
+    """Collect the title, last modification and type of the published ontology.
+
+    The subjects typed as ontology, profile or concept scheme are looked up
+    once each, and all of their properties are read in the same pass.
+
+    Args:
+        od (OntPub): the pylode document holding the ontology graph
+
+    Returns:
+        dict: with title, lastmod and type, None where the ontology has none
+    """
+    title, lastmod, pub_type = None, None, None
+    for rdf_type in PUB_TYPES:
+        for s in od.ont.subjects(RDF.type, rdf_type):
+            pub_type = str(rdf_type)
+            for predicate, obj in od.ont.predicate_objects(s):
+                if predicate == DCTERMS.title:
+                    title = str(obj)
+                elif predicate == DCTERMS.modified:
+                    lastmod = str(obj)
+    return dict(title=title, lastmod=lastmod, type=pub_type)
+
+
+def has_template_syntax(text):
+    """Tell if a text holds any jinja syntax, and so needs rendering."""
+    return TEMPLATE_MARKERS.search(text) is not None
+
+
+def package_version(package):
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return None
+
+
+def file_hash(path):
+    """Compute the sha256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    def od_title():
-        return ont_prop(od.ont, DCTERMS.title)
 
-    def od_lastmod():
-        return ont_prop(od.ont, DCTERMS.modified)
+def current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
 
-    return dict(title=od_title(), lastmod=od_lastmod())
 
+# the permissions of the published files, as open() would have created them
+OUTPUT_MODE = 0o666 & ~current_umask()
+
+
+def output_stats():
+    """Start counting the outputs written by a publish function.
+
+    Returns:
+        dict: the number of changed and unchanged outputs and the bytes written
+    """
+    return dict(changed=0, unchanged=0, bytes=0)
+
+
+def same_content(path, size, digest):
+    """Check if the file at path holds size bytes with the given sha256 digest."""
+    path = Path(path)
+    if not path.is_file() or path.stat().st_size != size:
+        return False
+    return file_hash(path) == digest()
+
+
+def record_written(written, size, changed):
+    if written is None:
+        return
+    if changed:
+        written["changed"] += 1
+        written["bytes"] += size
+    else:
+        written["unchanged"] += 1
+
+
+def commit_output(tmp, path, written=None, previous=None):
+    """Move a freshly written temporary file onto path, if its content changed.
+
+    Identical outputs are left untouched, keeping their modification time, so
+    rsync and the diffing of the pages artifact only see the files that changed.
+    Otherwise the file is replaced atomically, readers never see a partial file.
+
+    Args:
+        tmp: the temporary file holding the new content, see temp_output
+        path: the output file
+        written: optional output_stats to count the output in
+        previous: optional earlier version of path set aside to compare with,
+            restored as path when the content is the same
+
+    Returns:
+        int: the number of bytes written, 0 if the output was unchanged
+    """
+    size = os.path.getsize(tmp)
+    if same_content(previous or path, size, lambda: file_hash(tmp)):
+        os.remove(tmp)
+        if previous is not None:
+            os.replace(previous, path)
+        record_written(written, size, False)
+        return 0
+    os.chmod(tmp, OUTPUT_MODE)
+    os.replace(tmp, path)
+    if previous is not None:
+        os.remove(previous)
+    record_written(written, size, True)
+    return size
+
+
+def temp_output(path):
+    """Create an empty temporary file next to path, to write its new content in."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    return tmp
+
+
+@contextmanager
+def output_file(path, written=None, mode="w"):
+    """Open an output for writing, committed by commit_output when the block completes.
+
+    Args:
+        path: the output file
+        written: optional output_stats to count the output in
+        mode: "w" for text (utf-8) or "wb" for bytes
+    """
+    tmp = temp_output(path)
+    try:
+        encoding = None if "b" in mode else "utf-8"
+        with open(tmp, mode, encoding=encoding) as out:
+            yield out
+        commit_output(tmp, path, written)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_output(path, content, written=None):
+    """Write text or bytes to path, unless the file already holds exactly that content.
+
+    Returns:
+        int: the number of bytes written, 0 if the output was unchanged
+    """
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    if same_content(path, len(data), lambda: hashlib.sha256(data).hexdigest()):
+        record_written(written, len(data), False)
+        return 0
+    tmp = temp_output(path)
+    try:
+        with open(tmp, "wb") as out:
+            out.write(data)
+        return commit_output(tmp, path, written)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def copy_output(source, path, written=None):
+    """Copy the file source to path, unless path already holds the same content."""
+    with open(source, "rb") as source_file, output_file(path, written, "wb") as out:
+        shutil.copyfileobj(source_file, out, COPY_CHUNK)
+
+
+def output_totals(*results):
+    """Add up the output_stats in the results of the publish functions.
+
+    Args:
+        results: dicts of results per file, reused results have no output_stats
+    """
+    totals = output_stats()
+    for result in results:
+        for nspub in result.values():
+            for key, count in nspub.get("outputs", dict()).items():
+                totals[key] += count
+    return totals
+
+
+DUPLICATES = ("copy", "hardlink", "symlink", "redirect")
+REDIRECT_PAGE = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <link rel="canonical" href="{href}">
+    <meta http-equiv="refresh" content="0; url={href}">
+    <script>location.replace({target} + location.hash);</script>
+  </head>
+  <body>
+    <p>This page moved to <a href="{href}">{title}</a>.</p>
+  </body>
+</html>
+"""
+
+
+def resolve_duplicates(duplicates=None):
+    """Resolve how pages published in two places are written, None or "" for copy.
+
+    Returns:
+        One of DUPLICATES
+    """
+    if duplicates is None or str(duplicates).strip() == "":
+        return "copy"
+    duplicates = str(duplicates).strip().lower()
+    if duplicates not in DUPLICATES:
+        raise ValueError(
+            f"duplicates should be one of {', '.join(DUPLICATES)}, not '{duplicates}'"
+        )
+    return duplicates
+
+
+def redirect_page(href):
+    """Make a page sending the browser on to href, keeping the #fragment of the url."""
+    return REDIRECT_PAGE.format(
+        title=escape(Path(href).name),
+        href=escape(href),
+        target=escape(json.dumps(href), quote=False),
+    )
+
+
+def is_linked(source, path, href, duplicates):
+    """Check if path already is the hardlink or symlink to source link_output makes."""
+    if duplicates == "symlink":
+        return path.is_symlink() and os.readlink(path) == href
+    return path.is_file() and not path.is_symlink() and os.path.samefile(source, path)
+
+
+def link_output(source, path, duplicates="copy", written=None):
+    """Publish the file source a second time, at path.
+
+    Hardlinks and relative symlinks avoid a second copy of large pages, a
+    redirect page works on any host. When a link cannot be made (e.g. across
+    file systems) the file is copied instead.
+
+    Args:
+        source: the published file
+        path: where it is published again
+        duplicates: one of DUPLICATES, how to publish it again
+        written: optional output_stats to count the file in
+    """
+    source, path = Path(source), Path(path)
+    href = Path(os.path.relpath(source, path.parent)).as_posix()
+    if duplicates == "redirect":
+        write_output(path, redirect_page(href), written)
+        return
+    if duplicates in ("hardlink", "symlink"):
+        if is_linked(source, path, href, duplicates):
+            record_written(written, 0, False)
+            return
+        # a free name next to path, to move the new link in place with
+        tmp = temp_output(path)
+        os.remove(tmp)
+        try:
+            if duplicates == "hardlink":
+                os.link(source, tmp)
+            else:
+                os.symlink(href, tmp)
+            os.replace(tmp, path)
+            record_written(written, 0, True)
+            return
+        except OSError as e:
+            log.debug(f"cannot {duplicates} '{path}' to '{source}', copying it: {e}")
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+    copy_output(source, path, written)
+
+
+def previous_output(path):
+    """Return where the output at path is set aside while it is being rebuilt."""
+    path = Path(path)
+    return path.with_name(f".{path.name}.previous")
+
+
+def build_config(
+    baseuri, template_path, auto_camel_case=True, page_size=None, duplicates=None
+):
+    """Describe the settings the outputs of a build depend on, next to the input files.
+
+    Args:
+        baseuri: The baseuri applied in the build
+        template_path: Folder holding the templates used for the vocabularies
+        auto_camel_case: The auto_camel_case setting of the build
+        page_size: The vocab_page_size setting of the build
+        duplicates: The duplicates setting of the build
+
+    Returns:
+        Dict with the baseuri, auto_camel_case, page size, duplicates, template
+        hashes and tool versions
+    """
+    template_path = Path(template_path)
+    return dict(
+        baseuri=baseuri,
+        auto_camel_case=auto_camel_case,
+        page_size=resolve_page_size(page_size),
+        duplicates=resolve_duplicates(duplicates),
+        templates={name: file_hash(template_path / name) for name in VOCAB_TEMPLATES},
+        pylode=plv,
+        pysubyt=package_version("pysubyt"),
+    )
+
+
+def load_manifest(outfolder, config):
+    """Load the manifest of the previous build from the outfolder.
+
+    The recorded inputs are only retained if that build used the same config,
+    any change in settings, templates or tool versions leads to a full rebuild.
+
+    Args:
+        outfolder: The folder holding the outputs (and manifest) of the build
+        config: The build_config of the current build
+
+    Returns:
+        Dict with the config and the inputs that may be reused
+    """
+    manifest = dict(config=config, inputs=dict())
+    manifest_path = Path(outfolder) / MANIFEST_NAME
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            previous = json.load(manifest_file)
+    except (OSError, ValueError):
+        log.debug(f"no usable build manifest at '{manifest_path}'")
+        return manifest
+    if previous.get("config") == config:
+        manifest["inputs"] = previous.get("inputs", dict())
+    else:
+        log.info("build settings changed since the previous build, rebuilding all")
+    return manifest
+
+
+def save_manifest(outfolder, manifest):
+    manifest_path = Path(outfolder) / MANIFEST_NAME
+    os.makedirs(manifest_path.parent, exist_ok=True)
+    # replaced as a whole, a build cut short never leaves a truncated manifest,
+    # and left untouched when unchanged
+    content = json.dumps(manifest, indent=2, sort_keys=True)
+    if write_output(manifest_path, content):
+        log.debug(f"build manifest written to '{manifest_path}'")
+    else:
+        log.debug(f"build manifest at '{manifest_path}' is unchanged")
+
+
+def pair_sources(nsfolder, nssub, nsname):
+    """List the source files that get published together with nsname.
+
+    An ontology X.ttl and a vocabulary X.csv (either of them possibly _draft)
+    end up merged in the same X.ttl by combine_ttls, so they are fingerprinted
+    and rebuilt as a pair.
+    """
+    stem = Path(nsname).stem.replace("_draft", "")
+    folder = Path(nsfolder) / nssub
+    candidates = [
+        folder / f"{stem}{suffix}"
+        for suffix in (".ttl", "_draft.ttl", ".csv", "_draft.csv")
+    ]
+    return [path for path in candidates if path.exists()]
+
+
+def pair_key(nskey):
+    """Identify the pair of source files (see pair_sources) nskey belongs to."""
+    path = Path(nskey)
+    return path.parent.as_posix(), path.stem.replace("_draft", "")
+
+
+def published_outputs(outfolder, nssub, nsname, merged=False):
+    """List the main output files that are produced for the source file nsname.
+
+    The ttl of a vocabulary is only listed when it is not merged into the ttl
+    of the ontology it is paired with.
+    """
+    stem = Path(nsname).stem.replace("_draft", "")
+    outfolder = Path(outfolder)
+    if nsname.endswith(".csv"):
+        outputs = [
+            outfolder / f"{stem}_vocab.html",
+            outfolder / nssub / stem / f"{stem}_vocab.html",
+            search_entries_path(outfolder, nssub, nsname),
+        ]
+        if not merged:
+            outputs.append(outfolder / f"{stem}_vocab.ttl")
+        return outputs
+    return [
+        outfolder / nssub / f"{stem}.ttl",
+        outfolder / nssub / f"{stem}.html",
+        outfolder / nssub / stem / f"{stem}.html",
+        search_entries_path(outfolder, nssub, nsname),
+    ]
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """Record the wall and CPU time spent in a with-block as timings[stage]."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        timings[stage] = dict(
+            wall=round(time.perf_counter() - wall, 4),
+            cpu=round(time.process_time() - cpu, 4),
+        )
+
+
+def timing_report(*results):
+    """Gather the stage timings of the published files into a report.
+
+    Args:
+        results: dicts of results per file, as returned by the publish functions
+
+    Returns:
+        dict: the timings and totals per file, and the totals per stage
+    """
+    files, stages = dict(), dict()
+    for result in results:
+        for nskey, nspub in result.items():
+            timings = nspub.get("timings", dict())
+            total = dict(wall=0.0, cpu=0.0)
+            for stage, spent in timings.items():
+                stage_total = stages.setdefault(stage, dict(wall=0.0, cpu=0.0))
+                for clock in total:
+                    total[clock] += spent[clock]
+                    stage_total[clock] += spent[clock]
+            files[nskey] = dict(stages=timings, total=total, memory=nspub.get("memory"))
+    for totals in [timing["total"] for timing in files.values()] + list(stages.values()):
+        for clock in totals:
+            totals[clock] = round(totals[clock], 4)
+    return dict(files=files, stages=stages)
+
+
+def save_timing_report(outfolder, report, top=10):
+    """Write the timing report next to the outputs and log the slowest files and stages."""
+    content = json.dumps(report, indent=2, sort_keys=True)
+    write_output(Path(outfolder) / TIMINGS_NAME, content)
+    log.info("Slowest files (wall / cpu seconds, peak MB):")
+    slowest = sorted(
+        report["files"].items(),
+        key=lambda item: item[1]["total"]["wall"],
+        reverse=True,
+    )
+    for nskey, timing in slowest[:top]:
+        total = timing["total"]
+        peak = (timing["memory"] or dict()).get("peak_rss")
+        log.info(f"  {total['wall']:8.3f} / {total['cpu']:8.3f}, {peak} MB  {nskey}")
+    log.info("Time spent per stage (wall / cpu seconds):")
+    for stage, spent in sorted(
+        report["stages"].items(), key=lambda item: item[1]["wall"], reverse=True
+    ):
+        log.info(f"  {spent['wall']:8.3f} / {spent['cpu']:8.3f}  {stage}")
+
+
+def manifest_entry(manifest, nskey):
+    if manifest is None:
+        return None
+    return manifest["inputs"].get(nskey)
+
+
+def record_manifest_entry(manifest, nskey, nspub):
+    """Move the fingerprint out of a result and record successful ones in the manifest.
+
+    A failure drops the entries of all sources paired with nskey, as the
+    outputs they are merged into need to be produced again as a whole.
+    """
+    fingerprint = nspub.pop("fingerprint", None)
+    if manifest is None:
+        return
+    if fingerprint is None or nspub.get("error"):
+        for key in list(manifest["inputs"]):
+            if pair_key(key) == pair_key(nskey):
+                del manifest["inputs"][key]
+    else:
+        # the timings and memory use are those of this build only
+        result = {
+            key: value for key, value in nspub.items() if key not in BUILD_STATS
+        }
+        manifest["inputs"][nskey] = dict(fingerprint=fingerprint, result=result)
+
+
+def input_fingerprint(nsfolder, nssub, nsname):
+    return {
+        path.name: file_hash(path) for path in pair_sources(nsfolder, nssub, nsname)
+    }
+
+
+def reusable_result(previous, fingerprint, nsfolder, nssub, nsname, outfolder):
+    """Check if the result of a previous build can be reused for nsname.
+
+    Args:
+        previous: Manifest entry of the previous build for nsname, or None
+        fingerprint: The input_fingerprint of nsname in the current build
+        nsfolder: The base namespace folder
+        nssub: The subfolder holding nsname
+        nsname: The source file name
+        outfolder: The folder holding the outputs
+
+    Returns:
+        A copy of the previously recorded result, or None if it needs a rebuild
+    """
+    if not previous or previous.get("fingerprint") != fingerprint:
+        return None
+    pairs = pair_sources(nsfolder, nssub, nsname)
+    merged = any(path.suffix == ".ttl" for path in pairs)
+    for path in pairs:
+        for output in published_outputs(outfolder, nssub, path.name, merged):
+            if not output.exists():
+                return None
+    return dict(previous["result"])
+
+
+class _AnchorScanner(HTMLParser):
+    """Single pass over a pylode html page, collecting what rewrite_property_anchors needs."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.entities = []  # (position, tag text, id, iri) per div.property.entity
+        self.toc_links = []  # (position, tag text, href) per <a> in div#toc
+        self._divs = []  # kinds of the currently open divs
+        self._entity = None  # entry for the entity div being scanned
+        self._th = None  # text of the <th> being scanned
+        self._iri = None  # state while looking for the IRI value
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "div":
+            kind = None
+            if attrs.get("id") == "toc":
+                kind = "toc"
+            elif attrs.get("class") == "property entity" and "id" in attrs:
+                kind = "entity"
+                pos = self.getpos()
+                self._entity = [pos, self.get_starttag_text(), attrs["id"], None]
+            self._divs.append(kind)
+        elif tag == "a" and "toc" in self._divs and "href" in attrs:
+            tag_text = self.get_starttag_text()
+            self.toc_links.append((self.getpos(), tag_text, attrs["href"]))
+        elif self._entity is not None and self._entity[3] is None:
+            # the IRI is in the <code> of the <td> following the <th>IRI</th>
+            if tag == "th":
+                self._th = []
+            elif tag == "td" and self._iri == "th":
+                self._iri = "td"
+            elif tag == "code" and self._iri == "td":
+                self._iri = []
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._divs:
+            if self._divs.pop() == "entity":
+                if isinstance(self._entity[3], str):
+                    self.entities.append(tuple(self._entity))
+                self._entity, self._th, self._iri = None, None, None
+        elif tag == "th" and self._th is not None:
+            if "".join(self._th) == "IRI" and self._iri is None:
+                self._iri = "th"
+            self._th = None
+        elif tag == "code" and isinstance(self._iri, list):
+            self._entity[3] = "".join(self._iri)
+            self._iri = "done"
+        elif tag == "td" and self._iri == "td":
+            self._iri = "done"  # no <code> in there, leave this entity as is
+
+    def handle_data(self, data):
+        if self._th is not None:
+            self._th.append(data)
+        if isinstance(self._iri, list):
+            self._iri.append(data)
+
+
+def _set_attribute(tag_text, attribute, value):
+    value = escape(value, quote=False).replace('"', "&quot;")
+    return re.sub(
+        rf"(\s{attribute}\s*=\s*)(\"[^\"]*\"|'[^']*'|[^\s\"'>]+)",
+        lambda m: f'{m.group(1)}"{value}"',
+        tag_text,
+        count=1,
+    )
+
+
+def rewrite_property_anchors(html, anchors=None):
+    """Give the entity divs of a pylode html page the fragment of their IRI as id.
+
+    The links in the table of contents pointing to those divs are updated
+    accordingly. The page is scanned once, building an index of the toc links
+    by href, and only the affected tags are rewritten in the original text.
+
+    Args:
+        html: The html produced by pylode
+        anchors: Optional dict to fill with the id of the entity div of each IRI
+
+    Returns:
+        The html with the rewritten ids and hrefs
+    """
+    scanner = _AnchorScanner()
+    scanner.feed(html)
+    scanner.close()
+    if anchors is not None:
+        for pos, tag_text, old_id, iri in scanner.entities:
+            anchors[iri] = iri.split("#")[1] if "#" in iri else old_id
+
+    # the entities are handled in document order, moving the toc links along
+    links_by_href = defaultdict(list)
+    for index, (pos, tag_text, href) in enumerate(scanner.toc_links):
+        links_by_href[href].append(index)
+    edits = dict()
+    for pos, tag_text, old_id, iri in scanner.entities:
+        if "#" not in iri:
+            continue
+        new_id = iri.split("#")[1]
+        moved = links_by_href.pop("#" + old_id, [])
+        links_by_href["#" + new_id].extend(moved)
+        edits[pos] = (tag_text, _set_attribute(tag_text, "id", new_id))
+    for href, indexes in links_by_href.items():
+        for index in indexes:
+            pos, tag_text, old_href = scanner.toc_links[index]
+            if old_href != href:
+                edits[pos] = (tag_text, _set_attribute(tag_text, "href", href))
+    if not edits:
+        return html
+
+    # splice the rewritten tags into the original text (positions are line/offset)
+    line_starts = [0] + [match.end() for match in re.finditer("\n", html)]
+    parts = []
+    done = 0
+    for (lineno, offset), (tag_text, new_tag_text) in sorted(edits.items()):
+        start = line_starts[lineno - 1] + offset
+        parts.append(html[done:start])
+        parts.append(new_tag_text)
+        done = start + len(tag_text)
+    parts.append(html[done:])
+    return "".join(parts)
+
+
+def add_describedby_link(html, ttl_name):
+    """Link an ontology html page to its ttl with a describedby link in the head.
+
+    Args:
+        html (str): the html content of the page
+        ttl_name (str): file name of the ttl next to the page
 
-def ontopub(baseuri, nsfolder, nssub, nsname, outfolder):
+    Returns:
+        str: the html with the link added before the closing head tag,
+            unchanged if the link is already there
+    """
+    # line example <link
+    #  href="./{{file}}.ttl"
+    #  rel="describedby"
+    #  type="text/turtle"
+    # />
+    link = f'<link href="./{ttl_name}" rel="describedby" type="text/turtle" />'
+    if link in html:
+        return html
+    return html.replace("</head>", f"{link}</head>", 1)
+
+
+SEARCH_SNIPPET = 200  # characters of a definition kept in the search index
+SEARCH_TOKEN = re.compile(r"\w+")
+LABEL_PREDICATES = (SKOS.prefLabel, RDFS.label, DCTERMS.title)
+DEFINITION_PREDICATES = (SKOS.definition, RDFS.comment, DCTERMS.description)
+
+
+def search_entries_path(outfolder, nssub, nsname):
+    """Return the file keeping the search entries of the source file nsname."""
+    return Path(outfolder) / SEARCH_FOLDER / nssub / f"{nsname}.json"
+
+
+def save_search_entries(path, entries, written=None):
+    """Keep the search entries of a published file for the search index.
+
+    The entries are written one by one as they come, a streamed vocabulary
+    never holds all of them.
+
+    Args:
+        path: the file to write, see search_entries_path
+        entries: iterable of [label, page, iri, definition] of the terms on the page
+        written: optional output_stats to count the file in
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with output_file(path, written) as entries_file:
+        entries_file.write("[")
+        for position, entry in enumerate(entries):
+            entry = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+            entries_file.write(f",{entry}" if position else entry)
+        entries_file.write("]")
+
+
+def snippet(text):
+    """Shorten a definition to the part kept in the search index."""
+    text = " ".join(str(text or "").split())
+    if len(text) <= SEARCH_SNIPPET:
+        return text
+    return text[: SEARCH_SNIPPET - 1].rsplit(" ", 1)[0] + "\u2026"
+
+
+def literal_text(graph, subject, predicates):
+    """Find the first english (or untagged) text of the subject for the predicates."""
+    for predicate in predicates:
+        fallback = None
+        for obj in graph.objects(subject, predicate):
+            if not isinstance(obj, Literal):
+                continue
+            if obj.language in (None, "en"):
+                return str(obj)
+            fallback = fallback or str(obj)
+        if fallback:
+            return fallback
+    return None
+
+
+def ontology_search_entries(graph, anchors, page):
+    """List the search entries of the terms on a pylode page.
+
+    Args:
+        graph: the ontology graph pylode made the page of
+        anchors: the id of the entity div of each IRI, see rewrite_property_anchors
+        page: the path of the page, relative to the outfolder
+
+    Returns:
+        list: [label, page#anchor, iri, definition] per term with a label
+    """
+    entries = []
+    for rdf_type in PUB_TYPES:
+        for subject in graph.subjects(RDF.type, rdf_type):
+            label = literal_text(graph, subject, LABEL_PREDICATES)
+            definition = literal_text(graph, subject, DEFINITION_PREDICATES)
+            if label:
+                entries.append([label, page, str(subject), snippet(definition)])
+    for iri, anchor in anchors.items():
+        subject = URIRef(iri)
+        label = literal_text(graph, subject, LABEL_PREDICATES)
+        if not label:
+            continue
+        definition = literal_text(graph, subject, DEFINITION_PREDICATES)
+        entries.append([label, f"{page}#{anchor}", iri, snippet(definition)])
+    return entries
+
+
+def search_tokens(*texts):
+    """Split texts into the lowercase words the search index is keyed on."""
+    return {
+        token
+        for text in texts
+        for token in SEARCH_TOKEN.findall(str(text or "").lower())
+        if len(token) > 1
+    }
+
+
+def build_search_index(entries):
+    """Make an inverted index of the search entries.
+
+    Returns:
+        dict: the docs ([label, page, iri, definition] each) and, per token,
+            the sorted list of the docs it appears in
+    """
+    docs = []
+    index = defaultdict(list)
+    for label, page, iri, definition in entries:
+        doc = len(docs)
+        docs.append([label, page, iri, definition])
+        fragment = re.split(r"[#/]", iri)[-1]
+        for token in search_tokens(label, fragment, definition):
+            index[token].append(doc)
+    return dict(docs=docs, index=dict(sorted(index.items())))
+
+
+def publish_search_index(outfolder, ontos, vocabs):
+    """Gather the search entries of all published files into one search index.
+
+    The index is written next to the index.html, whose search box loads it.
+
+    Args:
+        outfolder: the folder holding the published files
+        ontos: the results of publish_ontologies
+        vocabs: the results of publish_vocabs
+
+    Returns:
+        dict: the search index, see build_search_index
+    """
+    entries = []
+    for nskey, nspub in list(ontos.items()) + list(vocabs.items()):
+        path = Path(outfolder) / SEARCH_FOLDER / f"{nskey}.json"
+        if nspub.get("error") or not path.exists():
+            continue
+        with open(path, "r", encoding="utf-8") as entries_file:
+            entries.extend(json.load(entries_file))
+    search_index = build_search_index(entries)
+    content = json.dumps(search_index, ensure_ascii=False, separators=(",", ":"))
+    write_output(Path(outfolder) / SEARCH_INDEX_NAME, content)
+    log.info(
+        f"search index of {len(search_index['docs'])} terms"
+        f" and {len(search_index['index'])} words written"
+    )
+    return search_index
+
+
+def ontopub(
+    baseuri, nsfolder, nssub, nsname, outfolder, previous=None, duplicates="copy"
+):
     log.debug(f"ontology to process: {nssub}/{nsname} in {nsfolder}")
 
     nsfolder = Path(nsfolder)
@@ -111,78 +1267,122 @@ def ontopub(baseuri, nsfolder, nssub, nsname, outfolder):
 
     # and finally prefix it with the nssub if relevant to produce the jinja {{name}}
     name = name if str(nssub) == "." else str(nssub) + "/" + name
+
+    # skip the work if nothing changed since the previous build
+    fingerprint = input_fingerprint(nsfolder, nssub, nsname)
+    timings = dict()
+    with stage_timer(timings, "reuse_check"):
+        nspub = reusable_result(
+            previous, fingerprint, nsfolder, nssub, nsname, outfolder
+        )
+    if nspub is not None:
+        log.info(f"> {name} --> unchanged since previous build, reusing its outputs")
+        nspub["fingerprint"] = fingerprint
+        nspub["timings"] = timings
+        return nspub
     log.debug(f"> {name} --> ontopub work started")
 
     # ensure outfolder exists (indexpath is the deepest one)
     os.makedirs(outindexpath.parent, exist_ok=True)
     log.debug(f"> {name} --> created folders to contain '{outindexpath}'")
-    # make a backup
-    shutil.copyfile(nspath, outbackpath)
-    log.debug(f"> {name} --> backup original provided at '{outbackpath}'")
+    # outputs identical to those of the previous build are left untouched
+    written = output_stats()
 
     # apply jinja2 (building context with baseuri and self) -- build jinja2 context - execute
-    prms = dict(name=name, baseuri=baseuri)
-    templates_env = Environment(loader=FileSystemLoader(nsfolder))
-    template = templates_env.get_template(
-        str(nspath.relative_to(nsfolder)).replace("\\", "/")
-    )
-    outcome = template.render(prms)
-    log.debug(f"> {name} --> context for templates == {prms}")
-    with open(str(outpath), "w") as outfile:
-        outfile.write(outcome)
-    log.debug(f"> {name} --> processed ontlogy written to '{outpath}'")
+    with stage_timer(timings, "render"):
+        with open(nspath, "r", encoding="utf-8") as nsfile:
+            outcome = nsfile.read()
+        if has_template_syntax(outcome):
+            prms = dict(name=name, baseuri=baseuri)
+            # each ontology is rendered only once, no point in keeping it compiled
+            templates_env = template_environment(nsfolder, cached=False)
+            outcome = templates_env.from_string(outcome).render(prms)
+            log.debug(f"> {name} --> context for templates == {prms}")
+        else:
+            log.debug(f"> {name} --> no template syntax, published as is")
 
     nspub = dict(error=True)  # this assumes things will go bad :)
     # check if _draft is in the name
     try:  # apply pylode
-        od = OntPub(outpath)
-        log.debug(f"> {name} --> ontology loaded to pylode from '{outpath}'")
-        # ask pylode to make the html
-        od.make_html(destination=outhtmlpath, include_css=False)
-
-        # take the outhtmlpath and open it with bs4
-        output_html = open(outhtmlpath, "r")
-        soup = bs4.BeautifulSoup(output_html, "html.parser")
-        # find all divs with class="property entity"
-        # then find the  <th>IRI</th> in that div
-        # then take the <td><code>https://example.org/pylode2pages-test/emobonOntology#enaProjAccNum</code></td> that is next to the <th>IRI</th>
-        # copy the text between the # and the </code> tag
-        # replace the div id with that text
-
-        toc_div = soup.find("div", id="toc")
-        for div in soup.find_all("div", class_="property entity"):
-            try:
-                for th in div.find_all("th"):
-                    if th.text == "IRI":
-                        iri = th.find_next("td").find("code").text
-                        previous_id = div["id"]
-                        # find the a href tag in the div with id "toc" and replace the href with the iri.split("#")[1]
-                        for a in toc_div.find_all("a"):
-                            if a["href"] == "#" + previous_id:
-                                a["href"] = "#" + iri.split("#")[1]
-                        div["id"] = iri.split("#")[1]
-            except:
-                pass
-
-        # write the soup back to the file
-        with open(outhtmlpath, "w") as output_html:
-            output_html.write(str(soup))
+        # the ontology only replaces the published one once pylode processed it,
+        # so it is parsed from the rendered text, as if read from where it goes
+        with stage_timer(timings, "parse"):
+            od = OntPub(parse_ontology(outcome, outpath.as_uri()))
+        log.debug(f"> {name} --> ontology loaded to pylode from the rendered '{outpath}'")
+        # ask pylode to make the html, kept in memory until it is rewritten,
+        # linking the one stylesheet shared by all pages
+        with stage_timer(timings, "make_html"):
+            stylesheet = outfolder.resolve() / "pylode.css"
+            copy_output(PYLODE_CSS, stylesheet, written)
+            href = Path(os.path.relpath(stylesheet, outhtmlpath.parent)).as_posix()
+            html_content = pylode_html(od, href)
+
+        # give the entity divs (and the toc links to them) the fragment of their IRI as id
+        # and link the page to its ttl while the document is in hand anyway
+        with stage_timer(timings, "rewrite_html"):
+            anchors = dict()
+            html_content = rewrite_property_anchors(html_content, anchors)
+            html_content = add_describedby_link(html_content, outpath.name)
+            write_output(outhtmlpath, html_content, written)
 
         log.debug(f"> {name} --> html produced to '{outhtmlpath}'")
-        # also add an extra copy from name.html to name/index.html AND for the css as well
-        shutil.copy(outhtmlpath, outindexpath)
-        shutil.copy(
-            outhtmlpath.parent / "pylode.css", outindexpath.parent / "pylode.css"
-        )
+        # make a backup, and publish the processed ontology
+        with stage_timer(timings, "backup"):
+            if duplicates == "hardlink":
+                link_output(nspath, outbackpath, duplicates, written)
+            else:
+                copy_output(nspath, outbackpath, written)
+        log.debug(f"> {name} --> backup original provided at '{outbackpath}'")
+        # also publish name.html as name/name.html, a copy linking the stylesheet
+        # from one folder deeper, or a link to (or redirect page for) name.html
+        with stage_timer(timings, "copy"):
+            if any(path.suffix == ".csv" for path in pair_sources(nsfolder, nssub, nsname)):
+                # combine_ttls appends the vocabulary to this ttl, it compares the
+                # result with the combined ttl of the previous build, set aside here
+                if outpath.exists():
+                    os.replace(outpath, previous_output(outpath))
+                write_output(outpath, outcome)
+            else:
+                write_output(outpath, outcome, written)
+            log.debug(f"> {name} --> processed ontlogy published to '{outpath}'")
+            linked_css = None
+            if duplicates == "copy":
+                # unless pylode_html had to keep the stylesheet inlined
+                link = PYLODE_CSS_LINK.format(href=href)
+                if link in html_content:
+                    deeper = Path(os.path.relpath(stylesheet, outindexpath.parent))
+                    html_content = html_content.replace(
+                        link, PYLODE_CSS_LINK.format(href=deeper.as_posix()), 1
+                    )
+                write_output(outindexpath, html_content, written)
+            else:
+                link_output(outhtmlpath, outindexpath, duplicates, written)
+            if duplicates in ("hardlink", "symlink"):
+                # the same page, served from name/, looks for the stylesheet from there
+                linked_css = Path(os.path.normpath(outindexpath.parent / href))
+                if linked_css != stylesheet:
+                    link_output(stylesheet, linked_css, duplicates, written)
+            # the stylesheet that earlier builds copied next to name/name.html
+            folder_css = outindexpath.parent / "pylode.css"
+            if folder_css != linked_css and os.path.lexists(folder_css):
+                os.remove(folder_css)
         log.debug(f"> {name} --> copy added to '{outindexpath}'")
         # get some minimal metadata from the ttl since pylode loaded that into memory anyway?
-        nspub = extract_pub_dict(od)  # if we got here however, things should be ok
+        with stage_timer(timings, "metadata"):
+            nspub = extract_pub_dict(od)  # if we got here however, things should be ok
+            page = outhtmlpath.relative_to(outfolder.resolve()).as_posix()
+            save_search_entries(
+                search_entries_path(outfolder, nssub, nsname),
+                ontology_search_entries(od.ont, anchors, page),
+                written,
+            )
         nspub["draft"] = draft
         log.debug(f"> {name} --> ready with result == {nspub}")
         nspub["name"] = name
         nspub["relref"] = str(outindexpath.parent.relative_to(outfolder)).replace(
             "\\", "/"
         )
+        nspub["fingerprint"] = fingerprint
     except PylodeError as ple:
         log.error(
             f"> {name} --> pylode v.{plv} failed to process ontology at '{nspath}'"
@@ -199,6 +1399,8 @@ def ontopub(baseuri, nsfolder, nssub, nsname, outfolder):
         nspub["error_message"] = f"Unexpected error: {str(e)}"
     finally:
         # return the pub struct with core elements for the overview page
+        nspub["timings"] = timings
+        nspub["outputs"] = written
         log.debug(f"> {name} --> returning result == {nspub}")
         return nspub
 
@@ -214,132 +1416,133 @@ def publish_misc(baseuri, nsfolder, outfolder):
     # TODO consider generating CNAME file with content derived from baseuri
 
 
-def publish_combined_index(baseuri, nsfolder, outfolder, template_path, logconf=None):
+def combined_index_entries(outfolder, sources):
+    """Find the folders that get a combined index, with the pages to list in each.
+
+    Every ontology name.ttl is published again as name/name.html and every
+    vocabulary name.csv as name/name_vocab.html, the pages of the two end up
+    in the same folder when they share their name.
+
+    Args:
+        outfolder (Path): the folder holding the published files
+        sources (list): the discovered SourceFile entries
+
+    Returns:
+        dict: per folder (relative to the outfolder) the ontology and vocabulary
+            page in it, an empty string when there is none
+    """
+    entries = dict()
+    for source in sources:
+        if source.kind in (ONTOLOGY, DRAFT):
+            key, page = "ontology", f"{source.stem}.html"
+        elif source.kind == VOCABULARY:
+            key, page = "vocabulary", f"{source.stem}_vocab.html"
+        else:
+            continue
+        folder = (Path(source.nssub) / source.stem).as_posix()
+        if not (outfolder / folder / page).exists():
+            log.debug(f"no {key} page '{page}' in '{folder}' to list")
+            continue
+        entries.setdefault(folder, dict(ontology="", vocabulary=""))[key] = page
+    return entries
+
+
+def publish_combined_index(
+    baseuri,
+    nsfolder,
+    outfolder,
+    template_path,
+    logconf=None,
+    ignore_folders=None,
+    workers=None,
+    sources=None,
+):
+    """Write an index.html listing the ontology and vocabulary pages of each name/ folder.
+
+    Args:
+        baseuri (str): the baseuri of the published files
+        nsfolder (str): the folder holding the ontologies and vocabularies
+        outfolder (str): the folder holding the published files
+        template_path: the folder with the templates
+        logconf (str): the logging configuration
+        ignore_folders (str): the folders of the nsfolder to skip
+        workers (int): number of worker processes to render with
+        sources (list): the discovered SourceFile entries, to avoid walking the nsfolder
+
+    Returns:
+        dict: per folder (relative to the outfolder) the result of writing its index
+    """
     enable_logging(logconf)
     # default target folder to input folder
     outfolder = nsfolder if outfolder is None else outfolder
     outfolder = Path(outfolder).resolve()
     nsfolder = Path(nsfolder).resolve()
+    workers = resolve_workers(workers)
     log.debug(
         f"publishing combined index from '{nsfolder}' to '{outfolder}' while applying baseuri={baseuri}"
     )
 
-    processing_list = list()
+    if sources is None:
+        sources = discover_sources(nsfolder, parse_ignore_folders(ignore_folders))
+    entries = combined_index_entries(outfolder, sources)
+    folders = sorted(entries)
+
+    # the pages are small, each worker renders a share of them
+    batches = max(1, min(workers, len(folders)))
+    jobs = []
+    for batch in range(batches):
+        share = {folder: entries[folder] for folder in folders[batch::batches]}
+        jobs.append((baseuri, outfolder, template_path, share))
+    combined = dict()
+    for result in run_jobs(combined_index_pub, jobs, batches):
+        result.pop("memory", None)
+        combined.update(result)
+    combined = {folder: combined[folder] for folder in folders}
+
+    combined_in_err = [folder for folder, result in combined.items() if result["error"]]
+    for folder in combined_in_err:
+        log.error(f"failed to process combined index for {folder}")
+        log.error(f"error message: {combined[folder]['error_message']}")
+    log.info(f"combined index written for {len(combined)} folders")
+    return combined
 
-    root_folder_name = outfolder.parts[-1]
-    log.debug(f"root folder name is {root_folder_name}")
-    # run over nsfolder and process ontology files
-    for folder, dirs, nsfiles in os.walk(outfolder, topdown=False, followlinks=True):
-        for nsname in nsfiles:
-            parent_folder = Path(folder).parts[-1]
-            nssub = Path(folder).relative_to(outfolder)
-            if parent_folder == root_folder_name:
-                continue
-            if nsname.endswith(".html"):
-                # check if the name contains _vocab
-                if nsname.endswith("_vocab.html") or nsname.endswith(
-                    "_vocab_draft.html"
-                ):
-                    prsnt = False
-                    for item in processing_list:
-                        if item["folder"] == parent_folder:
-                            item["vocabularies"] = nsname
-                            break
-                    if not prsnt:
-                        processing_list.append(
-                            {
-                                "folder": parent_folder,
-                                "ontologies": "",
-                                "vocabularies": nsname,
-                                "nssub": nssub,
-                            }
-                        )
-                    continue
-                # go over processing list and check if the parent folder is already present in the folder key of the dict
-                prsnt = False
-                for item in processing_list:
-                    if item["folder"] == parent_folder:
-                        item["ontologies"] = nsname
-                        prsnt = True
-                        break
-                if not prsnt:
-                    processing_list.append(
-                        {
-                            "folder": parent_folder,
-                            "ontologies": nsname,
-                            "vocabularies": "",
-                            "nssub": nssub,
-                        }
-                    )
 
-                # take the last part of the folder
-                log.debug(f"parent_folder={parent_folder}")
-                log.debug(f"processing {nsname} in {folder} in dir {dirs}")
-    # Note: We now keep vocabulary-only entries (when ontologies == "" and vocabularies != "")
-    # This allows publishing vocabularies without corresponding ontologies
+def combined_index_pub(baseuri, outfolder, template_path, entries):
+    """Render the combined index of some folders, with one compiled template.
 
-    # run over the processing list and create the combined index
-    # init result sets
+    Args:
+        baseuri (str): the baseuri of the published files
+        outfolder (Path): the folder holding the published files
+        template_path: the folder with the templates
+        entries (dict): per folder the ontology and vocabulary page, see combined_index_entries
+
+    Returns:
+        dict: per folder the result of writing its index.html
+    """
+    template = get_template(template_path, "template_combined_index.html")
     combined = dict()
-    combined_in_err = set()
-    for item in processing_list:
-        nscombined = combined_index_pub(
-            baseuri,
-            nsfolder,
-            item["nssub"],
-            item["ontologies"],
-            outfolder,
-            item["ontologies"],
-            item["vocabularies"],
-            template_path,
-        )
-        if nscombined["error"]:
-            log.error(f"failed to process combined index for {item['folder']}")
-            log.error(f"error message: {nscombined['error_message']}")
-            combined_in_err.add(item["folder"])
-        combined[item["folder"]] = nscombined
+    for folder, pages in entries.items():
+        log.debug(f"combined index to process: {folder} in {outfolder}")
+        toreturn = dict(error=False, outputs=output_stats())
+        try:
+            # generate a proper index.html file using an embedded jinja-template
+            prms = dict(baseuri=baseuri, nssub=folder, **pages)
+            outcome = template.render(prms)
+            log.debug(f"> INDEX --> context for template == {prms}")
+            outindexpath = outfolder / folder / "index.html"
+            write_output(outindexpath, outcome, toreturn["outputs"])
+            log.debug(
+                f"> INDEX --> overview of processed combined index written to '{outindexpath}'"
+            )
+        except Exception as e:
+            toreturn["error"] = True
+            log.debug(f"> INDEX --> error while processing combined index for {folder}")
+            log.error(e)
+            toreturn["error_message"] = str(e)
+        combined[folder] = toreturn
     return combined
 
 
-def combined_index_pub(
-    baseuri, nsfolder, nssub, nsname, outfolder, ontology, vocabulary, template_path
-):
-    log.debug(f"combined index to process: {nssub}/{nsname} in {nsfolder}")
-    log.debug(
-        f"other params: baseuri={baseuri}, outfolder={outfolder}/{nssub}, ontology={ontology}, vocabulary={vocabulary}"
-    )
-    toreturn = dict()
-    try:
-        # generate a proper index.html file using an embedded jinja-template
-        prms = dict(
-            ontology=ontology,
-            baseuri=baseuri,
-            vocabulary=vocabulary,
-            nsname=nsname,
-            nssub=nssub,
-        )
-        templates_env = Environment(loader=FileSystemLoader(template_path))
-        template = templates_env.get_template("template_combined_index.html")
-        outcome = template.render(prms)
-        log.debug(f"> INDEX --> context for template == {prms}")
-        outindexpath = outfolder / nssub / "index.html"
-        with open(str(outindexpath), "w") as outfile:
-            outfile.write(outcome)
-        log.debug(
-            f"> INDEX --> overview of processed combined index written to '{outindexpath}'"
-        )
-        toreturn["error"] = False
-    except Exception as e:
-        toreturn["error"] = True
-        log.debug(
-            f"> INDEX --> error while processing combined index for {nssub}/{nsname}"
-        )
-        log.error(e)
-        toreturn["error_message"] = str(e)
-    finally:
-        return toreturn
-
-
 def is_uri_compliant(fragment):
     """Check if a fragment identifier is URI-compliant (can be used in a URI without encoding).
 
@@ -358,24 +1561,49 @@ def is_uri_compliant(fragment):
     return bool(re.match(r"^[A-Za-z0-9_.-]+$", fragment))
 
 
-def validate_csv_ids(csv_data, auto_camel_case=True):
+def validate_csv_ids(csv_data, auto_camel_case=True, fragment_ids=None):
     """Validate that CSV IDs are unique and URI-compliant, applying camelCase if needed.
 
     Args:
         csv_data: List of dictionaries representing CSV rows
         auto_camel_case: If True, applies camelCase to non-compliant IDs
+        fragment_ids: Optional dict to fill with the fragment table of the
+            vocabulary, mapping each ID (and each normalized id onto itself)
+            onto its normalized fragment id
 
     Returns:
         Tuple of (validated_data, errors) where:
         - validated_data: List of dicts with normalized 'fragment_id' field
         - errors: List of error messages
-
-    Raises:
-        ValueError: If IDs are not unique or cannot be normalized
     """
     errors = []
-    seen_ids = {}
-    validated_data = []
+    rows = (row.copy() for row in csv_data)
+    validated_data = list(iter_valid_rows(rows, auto_camel_case, errors, fragment_ids))
+    return validated_data, errors
+
+
+def iter_valid_rows(
+    csv_data, auto_camel_case=True, errors=None, fragment_ids=None, seen_ids=None
+):
+    """Check the CSV IDs row by row, yielding the valid rows as they come.
+
+    Each row yielded gets its normalized 'fragment_id' field added (in place).
+    Rows without an ID, or with a non-compliant one when auto_camel_case is
+    disabled, are left out. Duplicate IDs are reported, but still yielded.
+
+    Args:
+        csv_data: Iterable of dictionaries representing CSV rows
+        auto_camel_case: If True, applies camelCase to non-compliant IDs
+        errors: Optional list to append the error messages to
+        fragment_ids: Optional dict to fill with the fragment table, see validate_csv_ids
+        seen_ids: Optional dict to note the row of each fragment in, a DiskTable
+            keeps it out of memory for very large vocabularies
+
+    Yields:
+        The valid rows, with their 'fragment_id'
+    """
+    errors = [] if errors is None else errors
+    seen_ids = dict() if seen_ids is None else seen_ids
 
     for idx, row in enumerate(csv_data):
         row_num = idx + 2  # +2 because CSV has header row and 1-indexed
@@ -416,12 +1644,14 @@ def validate_csv_ids(csv_data, auto_camel_case=True):
         else:
             seen_ids[fragment] = row_num
 
-        # Add normalized fragment to row data
-        row_data = row.copy()
-        row_data["fragment_id"] = fragment
-        validated_data.append(row_data)
+        if fragment_ids is not None:
+            fragment_ids[row["ID"]] = fragment
+            fragment_ids[fragment_source] = fragment
+            fragment_ids[fragment] = fragment
 
-    return validated_data, errors
+        # Add normalized fragment to row data
+        row["fragment_id"] = fragment
+        yield row
 
 
 def camel_case(value, auto_convert=True):
@@ -453,8 +1683,334 @@ def camel_case(value, auto_convert=True):
     return words[0].lower() + "".join(word.title() for word in words[1:])
 
 
+def rewrite_fragments(text, base_iri, fragment_ids, auto_camel_case=True):
+    """Normalise the fragments of all IRIs <base_iri + fragment> in a single pass.
+
+    Args:
+        text: The text (ttl) to rewrite
+        base_iri: The IRI up to and including the '#'
+        fragment_ids: The fragment table of the vocabulary, see validate_csv_ids
+        auto_camel_case: If True, applies camelCase to fragments not in the table
+
+    Returns:
+        The rewritten text
+    """
+    return fragment_rewriter(base_iri, fragment_ids, auto_camel_case)(text)
+
+
+def fragment_rewriter(base_iri, fragment_ids, auto_camel_case=True):
+    """Make the function rewrite_fragments applies, to reuse it on many pieces of text.
+
+    Returns:
+        A function rewriting the IRI fragments in the text passed to it
+    """
+    # Match the fragment part after the # (everything until the closing >)
+    pattern = re.compile(re.escape(base_iri) + r"([^>]+)")
+    # the fragments converted here are noted on the side, the table is left as is
+    converted = dict()
+
+    def replace(match):
+        fragment = match.group(1)
+        # keep any trailing whitespace/newlines (but not in the fragment itself)
+        fragment_clean = fragment.rstrip()
+        new_id = converted.get(fragment_clean)
+        if new_id is None:
+            new_id = fragment_ids.get(fragment_clean)
+        if new_id is None:
+            new_id = camel_case(fragment_clean, auto_camel_case)
+            log.debug(f"Converting IRI fragment: '{fragment_clean}' -> '{new_id}'")
+            converted[fragment_clean] = new_id
+        return f"{base_iri}{new_id}{fragment[len(fragment_clean):]}"
+
+    return lambda text: pattern.sub(replace, text)
+
+
+def read_csv_rows(nspath):
+    """Read the rows of a vocabulary csv as dicts, one at a time."""
+    with open(nspath, "r", encoding="utf-8-sig") as csvfile:
+        yield from csv.DictReader(csvfile)
+
+
+class DiskTable:
+    """A dict of json values kept in a temporary sqlite file rather than in memory.
+
+    Holds the per-concept tables of a streamed vocabulary (fragment ids,
+    labels), which would otherwise grow with its size. Supports the part of
+    the dict interface the validation and the templates use, and lists its
+    items in the order their keys were first set.
+    """
+
+    def __init__(self):
+        # an empty name gives a private database in a file removed on close
+        self.db = sqlite3.connect("")
+        self.db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT)")
+
+    def __setitem__(self, key, value):
+        self.db.execute(
+            "INSERT INTO entries VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def __getitem__(self, key):
+        found = self.db.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if found is None:
+            raise KeyError(key)
+        return json.loads(found[0])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        found = self.db.execute("SELECT 1 FROM entries WHERE key = ?", (key,))
+        return found.fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def items(self):
+        for key, value in self.db.execute(
+            "SELECT key, value FROM entries ORDER BY rowid"
+        ):
+            yield key, json.loads(value)
+
+    def close(self):
+        self.db.close()
+
+
+class CsvRows:
+    """The valid rows of a vocabulary csv, streamed from the file on every loop.
+
+    The templates loop over the rows more than once. Rather than holding all
+    of them in memory, each loop reads them from the csv again, so the memory
+    use does not grow with the size of the vocabulary. The rows were validated
+    before, each gets its fragment id from the fragment table (and is passed
+    through resolve, if given). Only used for csv files above VOCAB_STREAM_SIZE,
+    re-reading is slower than keeping the rows.
+    """
+
+    def __init__(self, nspath, fragment_ids, resolve=None):
+        self.nspath = nspath
+        self.fragment_ids = fragment_ids
+        self.resolve = resolve
+
+    def __iter__(self):
+        for row in read_csv_rows(self.nspath):
+            # rows left out by the validation are not in the fragment table
+            fragment = self.fragment_ids.get(row.get("ID") or "")
+            if fragment is not None:
+                row["fragment_id"] = fragment
+                yield row if self.resolve is None else self.resolve(row)
+
+
+HIERARCHY_COLUMNS = ("BROADER", "NARROWER")
+
+
+def parse_hierarchy(value):
+    """Split a BROADER or NARROWER cell, [id;id;...] or a single id, into its references."""
+    value = (value or "").replace("[", "").replace("]", "")
+    return [ref.strip() for ref in value.split(";") if ref.strip()]
+
+
+def is_external(ref):
+    """Check if a hierarchy reference is an IRI rather than an ID in the same csv."""
+    return ref.startswith(("http://", "https://"))
+
+
+def hierarchy_resolver(base_iri, fragment_ids, labels, pages=None):
+    """Make the function resolving the broader and narrower concepts of a row.
+
+    Each reference in the BROADER and NARROWER cells becomes a dict with the
+    IRI of the concept, the href to it in the html and its label (None if it
+    is not in the csv), set as the broader and narrower lists of the row.
+
+    Args:
+        base_iri: The IRI of the concepts up to and including the '#'
+        fragment_ids: The fragment table of the vocabulary, see validate_csv_ids
+        labels: The labels of the concepts by their ID
+        pages: The page file of each fragment id, when spread over pages
+
+    Returns:
+        A function adding the resolved concepts to a row, and returning it
+    """
+    pages = pages or dict()
+
+    def concepts(value):
+        resolved = []
+        for ref in parse_hierarchy(value):
+            if is_external(ref):
+                resolved.append(dict(iri=ref, href=ref, label=None, external=True))
+                continue
+            fragment = fragment_ids.get(ref, ref)
+            resolved.append(
+                dict(
+                    iri=f"{base_iri}{fragment}",
+                    href=f"{pages.get(fragment, '')}#{fragment}",
+                    label=labels.get(ref),
+                    external=False,
+                )
+            )
+        return resolved
+
+    def resolve(row):
+        row["broader"] = concepts(row.get("BROADER"))
+        row["narrower"] = concepts(row.get("NARROWER"))
+        return row
+
+    return resolve
+
+
+def render_vocab(
+    template_path,
+    template_name,
+    rows,
+    vars_dict,
+    output,
+    line_filter=None,
+    written=None,
+):
+    """Render a vocabulary template straight into its output file.
+
+    The render function of the pysubyt generator is that of a jinja template,
+    which is rendered in chunks, so the page is never held in memory as a whole.
+
+    Args:
+        template_path: folder holding the vocabulary templates
+        template_name: name of the template to render
+        rows: the rows, looped over as sets['_'] in the template
+        vars_dict: the variables of the template
+        output: path of the file to write
+        line_filter: optional function applied to each line written
+        written: optional output_stats to count the file in
+    """
+    render = vocab_generator(template_path).make_render_fn(template_name)
+    template = getattr(render, "__self__", None)
+    if isinstance(template, Template):
+        chunks = template.generate(sets=dict(_=rows), vars_dict=vars_dict)
+    else:
+        chunks = [render(sets=dict(_=rows), vars_dict=vars_dict)]
+    with output_file(output, written) as outfile:
+        if line_filter is None:
+            outfile.writelines(chunks)
+            return
+        pending = ""
+        for chunk in chunks:
+            lines = (pending + chunk).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                outfile.write(line_filter(line) + "\n")
+        outfile.write(line_filter(pending))
+
+
+def resolve_page_size(page_size=None):
+    """Resolve the number of concepts per vocabulary page, None or "" for the default.
+
+    Returns:
+        The page size, 0 to never spread a vocabulary over pages
+    """
+    if page_size is None or str(page_size).strip() == "":
+        return VOCAB_PAGE_SIZE
+    return max(0, int(page_size))
+
+
+def shard_vocab(labels, fragment_ids, page_size, page_name, toc_file, pages):
+    """Spread the concepts of a vocabulary over pages of page_size concepts.
+
+    The table of contents is written as json to toc_file as the concepts come,
+    with the pages and the [fragment id, label, page] of each concept.
+
+    Args:
+        labels: The labels of the concepts by their ID, in the order of the csv
+        fragment_ids: The fragment table of the vocabulary, see validate_csv_ids
+        page_size: The number of concepts per page
+        page_name: The file name of the vocabulary page, the pages add -1, -2, ... to it
+        toc_file: The open file to write the table of contents to
+        pages: The dict (or DiskTable) to fill with the page file of each fragment id
+
+    Returns:
+        List of dicts with the page file, first and last label and count of each page
+    """
+    stem = Path(page_name).stem
+    count = -(-len(labels) // page_size)
+    names = [f"{stem}-{index + 1}.html" for index in range(count)]
+    toc_file.write(f'{{"pages":{json.dumps(names, separators=(",", ":"))},"concepts":[')
+    shards = []
+    for position, (id, label) in enumerate(labels.items()):
+        index = position // page_size
+        if index == len(shards):
+            shards.append(dict(page=names[index], first=label, last=label, count=0))
+        shard = shards[index]
+        shard["last"] = label
+        shard["count"] += 1
+        fragment = fragment_ids[id]
+        pages[fragment] = shard["page"]
+        concept = json.dumps([fragment, label, index], separators=(",", ":"))
+        toc_file.write(f",{concept}" if position else concept)
+    toc_file.write("]}")
+    return shards
+
+
+def remove_vocab_pages(output_folder, page_name, keep=()):
+    """Remove the pages (and the toc) a vocabulary was spread over in a previous build.
+
+    The pages named in keep (and their precompressed siblings) were rendered
+    again in this build, only those left over from a previous build are removed.
+    """
+    stem = Path(page_name).stem
+    pattern = re.compile(rf"({re.escape(stem)}-(?:\d+\.html|toc\.json))(\.gz|\.br)?")
+    for path in Path(output_folder).glob(f"{stem}-*"):
+        match = pattern.fullmatch(path.name)
+        if match and match.group(1) not in keep:
+            path.unlink()
+
+
+def render_vocab_pages(
+    template_path, template_name, rows, vars_dict, output_folder, shards, written=None
+):
+    """Render the rows of a vocabulary onto the pages it is spread over.
+
+    The rows are streamed, only those of the page being rendered are held in memory.
+    """
+    rows = iter(rows)
+    for index, shard in enumerate(shards):
+        pager = dict(
+            index=index + 1,
+            count=len(shards),
+            previous=shards[index - 1]["page"] if index > 0 else None,
+            next=shards[index + 1]["page"] if index + 1 < len(shards) else None,
+            landing=vars_dict["landing"],
+        )
+        page_rows = list(islice(rows, shard["count"]))
+        render_vocab(
+            template_path,
+            template_name,
+            page_rows,
+            dict(vars_dict, pager=pager),
+            Path(output_folder) / shard["page"],
+            written=written,
+        )
+        # the template macros leave the render context in a reference cycle,
+        # which would hold on to the rows until the next full garbage collection
+        page_rows.clear()
+
+
 def vocabpub(
-    baseuri, nsfolder, nssub, nsname, outfolder, template_path, auto_camel_case=True
+    baseuri,
+    nsfolder,
+    nssub,
+    nsname,
+    outfolder,
+    template_path,
+    auto_camel_case=True,
+    previous=None,
+    page_size=None,
+    duplicates="copy",
+    stream=None,
 ):
     log.debug(f"vocab to process: {nssub}/{nsname} in {nsfolder}")
     log.debug(
@@ -468,22 +2024,58 @@ def vocabpub(
     outindexpath = (outfolder / nssub / name).resolve() / name_html
 
     toreturn = dict()
+    timings = dict()
+    tables = []
     try:
+        # skip the work if nothing changed since the previous build
+        with stage_timer(timings, "reuse_check"):
+            fingerprint = input_fingerprint(nsfolder, nssub, nsname)
+            reused = reusable_result(
+                previous, fingerprint, nsfolder, nssub, nsname, outfolder
+            )
+        if reused is not None:
+            log.info(f"> {name} --> unchanged since previous build, reusing its outputs")
+            toreturn = reused
+            toreturn["fingerprint"] = fingerprint
+            return toreturn
+
         if nsname.endswith("_draft.csv"):
             draft = True
         else:
             draft = False
 
-        # Validate CSV IDs before processing
-        import csv
-
-        csv_data = []
-        with open(nspath, "r", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            csv_data = list(reader)
-
-        # Validate and normalize IDs
-        validated_data, validation_errors = validate_csv_ids(csv_data, auto_camel_case)
+        # very large csv files are streamed from the file on every template
+        # loop, with their tables on disk; the others are read once and their
+        # rows kept in memory
+        if stream is None:
+            stream = nspath.stat().st_size > VOCAB_STREAM_SIZE
+        if stream:
+            log.info(f"> {name} --> streaming the rows from the csv")
+            tables = [DiskTable() for _ in range(4)]
+            fragment_ids, labels, seen_ids, references = tables
+        else:
+            fragment_ids, labels, seen_ids, references = dict(), dict(), dict(), dict()
+        # Validate CSV IDs before processing, streaming through the rows to
+        # build the one fragment table (and the labels) for this vocabulary
+        with stage_timer(timings, "read_csv"):
+            rows = None if stream else []
+            validation_errors = []
+            valid_rows = 0
+            for row in iter_valid_rows(
+                read_csv_rows(nspath),
+                auto_camel_case,
+                validation_errors,
+                fragment_ids,
+                seen_ids,
+            ):
+                if rows is not None:
+                    rows.append(row)
+                labels[row["ID"]] = row.get("PREFLABEL_EN")
+                valid_rows += 1
+                for column in HIERARCHY_COLUMNS:
+                    for ref in parse_hierarchy(row.get(column)):
+                        if not is_external(ref) and ref not in references:
+                            references[ref] = (row["ID"], column)
 
         if validation_errors:
             error_msg = f"CSV validation errors in {nsname}:\n" + "\n".join(
@@ -495,12 +2087,17 @@ def vocabpub(
                 raise ValueError(error_msg)
             # For non-critical errors, just warn
             log.warning(
-                f"Proceeding with {len(validated_data)} valid rows out of {len(csv_data)} total rows"
+                f"Proceeding with {valid_rows} valid rows out of {valid_rows + len(validation_errors)} total rows"
             )
 
         log.info(
-            f"Validated {len(validated_data)} rows from {nsname}, all IDs are unique and URI-compliant"
+            f"Validated {valid_rows} rows from {nsname}, all IDs are unique and URI-compliant"
         )
+        for ref, (id, column) in references.items():
+            if ref not in fragment_ids:
+                log.warning(
+                    f"{nsname}: {column} of '{id}' refers to the missing ID '{ref}'"
+                )
 
         if draft:
             output_name_html = nsname.replace("_draft.csv", "_vocab.html")
@@ -508,11 +2105,8 @@ def vocabpub(
         else:
             output_name_html = nsname.replace(".csv", "_vocab.html")
             output_name_ttl = nsname.replace(".csv", "_vocab.ttl")
-        template_path = template_path
         template_name_html = "template_html.html"
         template_name_ttl = "template_ttl.ttl"
-        input_file = nsfolder / nssub / nsname
-        log.debug(f"input_file={input_file}")
 
         # check if the output folder exists, if not create it
         if draft:
@@ -523,128 +2117,142 @@ def vocabpub(
             signposting = baseuri + "/" + str(nsname).replace(".csv", "") + ".ttl"
         output_folder = outfolder / nssub / folder_name
         log.debug(f"output_folder={output_folder}")
-        if not output_folder.exists():
-            output_folder.mkdir(parents=True)
+        output_folder.mkdir(parents=True, exist_ok=True)
         outindexpath = outfolder / output_name_html
         outttlpath = outfolder / output_name_ttl
         relref = str(outindexpath.relative_to(outfolder)).replace("\\", "/")
+        # the concept IRIs, as they are in the ttl
+        base_iri = f"{baseuri}/{str(relref).replace('_vocab.html', '')}#"
         # html generation
-        args = {
-            "input": input_file.__str__(),
-            "output": (output_folder / output_name_html).__str__(),
-            "template_path": template_path,
-            "template_name": template_name_html,
-            "vars_dict": {
-                "baseuri": baseuri,
-                "signposting": signposting,
-                "title": str(nsname + " vocabulary").replace(".csv", ""),
-                "relref": str(relref).replace(".html", ""),
-                "draft": draft,
-            },
-        }
-        log.debug(f"arguments_pysubytd={args}")
-        service = JinjaBasedGenerator(args["template_path"])
-        source = {"_": SourceFactory.make_source(args["input"])}
-        sink = SinkFactory.make_sink(args["output"], force_output=True)
-        settings = GeneratorSettings()
-        service.process(args["template_name"], source, settings, sink, args)
-
-        # take the output html and parse it with bs4
-        output_html = open(output_folder / output_name_html, "r")
-        log.debug(f"output_html={output_html}")
-        soup = bs4.BeautifulSoup(output_html, "html.parser")
-        # find all divs with class="concept entity"
-        # then find the  <th>IRI</th> in that div
-        # replace the part after the # with the same part where the same string with not spaces and for each char after the space a capital letter
-        # then take the <td><code>https://example.org/pylode2pages-test/emobonOntology#enaProjAccNum</code></td> that is next to the <th>IRI</th>
-        # copy the text between the # and the </code> tag
-        # replace the div id with that text
-
-        toc_div = soup.find("div", id="toc")
-        for div in soup.find_all("div", class_="concept entity"):
-            try:
-                for th in div.find_all("th"):
-                    if th.text == "IRI":
-                        iri_element = th.find_next("td").find("code")
-                        iri = th.find_next("td").find("code").text
-                        log.debug(f"iri={iri}")
-                        previous_id = div["id"]
-                        # find the a href tag in the div with id "toc" and replace the href with the iri.split("#")[1]
-                        for a in toc_div.find_all("a"):
-                            if a["href"] == "#" + previous_id:
-
-                                # begin with the changing of the href
-                                new_id = camel_case(iri.split("#")[1], auto_camel_case)
-                                log.debug(f"new_id={new_id}")
-                                a["href"] = "#" + new_id
-                        div["id"] = new_id
-                        # replace the iri split part with the new_id
-                        iri_element.string = iri.replace(iri.split("#")[1], new_id)
-            except:
-                pass
-
-        # write the soup back to the file
-        with open(output_folder / output_name_html, "w") as output_html:
-            output_html.write(str(soup))
-
-        # ttl generation
-        second_args = {
-            "input": input_file.__str__(),
-            "output": (outttlpath).__str__(),
-            "template_path": template_path,
-            "template_name": template_name_ttl,
-            "vars_dict": {
-                "baseuri": baseuri,
-                "signposting": baseuri + "/" + nsname + ".ttl",
-                "title": str(nsname + " vocabulary").replace(".csv", ""),
-                "relref": str(relref).replace("_vocab.html", ""),
-            },
+        html_vars = {
+            "baseuri": baseuri,
+            "signposting": signposting,
+            "title": str(nsname + " vocabulary").replace(".csv", ""),
+            "relref": str(relref).replace(".html", ""),
+            "draft": draft,
         }
-        log.debug(f"arguments_pysubytd={second_args}")
-        service = JinjaBasedGenerator(second_args["template_path"])
-        source = {"_": SourceFactory.make_source(second_args["input"])}
-        sink = SinkFactory.make_sink(second_args["output"], force_output=True)
-        service.process(
-            second_args["template_name"], source, settings, sink, second_args
-        )
+        log.debug(f"html template: title={html_vars['title']}, relref={html_vars['relref']}")
+        page_size = resolve_page_size(page_size)
+        toc_name = output_name_html.replace(".html", "-toc.json")
+        pages, shards = dict(), None
+        # outputs identical to those of the previous build are left untouched
+        written = output_stats()
+        with stage_timer(timings, "pysubyt_html"):
+            if page_size and valid_rows > page_size:
+                # too large for one page: the vocabulary page becomes a landing
+                # page, sending the concept IRIs on to the page holding them
+                log.info(
+                    f"> {name} --> spreading {valid_rows} concepts over pages of {page_size}"
+                )
+                if stream:
+                    tables.append(DiskTable())
+                    pages = tables[-1]
+                with output_file(output_folder / toc_name, written) as toc_file:
+                    shards = shard_vocab(
+                        labels, fragment_ids, page_size, output_name_html, toc_file, pages
+                    )
+            # both passes share the valid rows, with their broader and narrower
+            # concepts resolved; the templates loop over the rows themselves,
+            # so each is rendered once
+            resolve = hierarchy_resolver(base_iri, fragment_ids, labels, pages)
+            if stream:
+                rows = CsvRows(nspath, fragment_ids, resolve)
+            else:
+                rows = [resolve(row) for row in rows]
+            if shards:
+                html_vars.update(landing=output_name_html)
+                render_vocab_pages(
+                    template_path,
+                    template_name_html,
+                    rows,
+                    html_vars,
+                    output_folder,
+                    shards,
+                    written,
+                )
+                html_vars.update(shards=shards, toc=toc_name, prefix="")
+                rows_html = []
+            else:
+                rows_html = rows
+            render_vocab(
+                template_path,
+                template_name_html,
+                rows_html,
+                html_vars,
+                output_folder / output_name_html,
+                written=written,
+            )
+            # the pages (and toc) of a previous build this one did not render again
+            keep = [shard["page"] for shard in shards] + [toc_name] if shards else []
+            remove_vocab_pages(output_folder, output_name_html, keep)
 
-        # open the ttl file and convert all IRI fragments to camelCase
-        output_ttl = open(outttlpath, "r")
-        log.debug(f"output_ttl={output_ttl}")
-        ttl_content = output_ttl.read()
-        output_ttl.close()
-
-        # Find all unique IRI fragments that need to be converted
-        # Pattern matches IRIs like: <baseuri/relref#FRAGMENT>
-        base_iri = f"{second_args['vars_dict']['baseuri']}/{second_args['vars_dict']['relref']}#"
-        # Match the fragment part after the # (everything until the closing >)
-        pattern = re.escape(base_iri) + r"([^>]+)"
-        fragments = set(re.findall(pattern, ttl_content))
-
-        # Convert each fragment to camelCase and replace all occurrences
-        for fragment in fragments:
-            # Strip any trailing whitespace/newlines (but not the fragment content itself)
-            fragment_clean = fragment.rstrip()
-            new_id = camel_case(fragment_clean, auto_camel_case)
-            log.debug(f"Converting IRI fragment: '{fragment_clean}' -> '{new_id}'")
-            # Replace all occurrences of this fragment in the content
-            old_iri = f"{base_iri}{fragment_clean}"
-            new_iri = f"{base_iri}{new_id}"
-            ttl_content = ttl_content.replace(old_iri, new_iri)
+        # ttl generation
+        ttl_vars = {
+            "baseuri": baseuri,
+            "signposting": baseuri + "/" + nsname + ".ttl",
+            "title": str(nsname + " vocabulary").replace(".csv", ""),
+            "relref": str(relref).replace("_vocab.html", ""),
+        }
+        log.debug(f"ttl template: title={ttl_vars['title']}, relref={ttl_vars['relref']}")
+        # normalise the remaining IRI fragments in the ttl lines as they are
+        # written (those used in full IRIs in the csv, the rows have the rest)
+        rewrite = fragment_rewriter(base_iri, fragment_ids, auto_camel_case)
+        with stage_timer(timings, "pysubyt_ttl"):
+            render_vocab(
+                template_path,
+                template_name_ttl,
+                rows,
+                ttl_vars,
+                outttlpath,
+                rewrite,
+                written,
+            )
 
-        # write the changes back to the ttl file
-        with open(outttlpath, "w") as output_ttl:
-            output_ttl.write(ttl_content)
+        with stage_timer(timings, "search"):
+            entries = (
+                [
+                    row.get("PREFLABEL_EN") or row["fragment_id"],
+                    f"{output_name_html}#{row['fragment_id']}",
+                    f"{base_iri}{row['fragment_id']}",
+                    snippet(row.get("DEFINITION_EN")),
+                ]
+                for row in rows
+            )
+            save_search_entries(
+                search_entries_path(outfolder, nssub, nsname), entries, written
+            )
 
-        shutil.copy((output_folder / output_name_html), outindexpath)
+        with stage_timer(timings, "copy"):
+            if shards:
+                # the landing page finds the pages next to the toc
+                prefix = output_folder.relative_to(outfolder).as_posix() + "/"
+                html_vars.update(prefix=prefix)
+                render_vocab(
+                    template_path,
+                    template_name_html,
+                    [],
+                    html_vars,
+                    outindexpath,
+                    written=written,
+                )
+            else:
+                link_output(
+                    output_folder / output_name_html, outindexpath, duplicates, written
+                )
         # shutil.copy((output_folder / output_name_ttl), outttlpath)
         toreturn["error"] = False
         toreturn["draft"] = draft
+        toreturn["pages"] = len(shards) if shards else 1
+        toreturn["outputs"] = written
+        toreturn["fingerprint"] = fingerprint
     except Exception as e:
         toreturn["error"] = True
         toreturn["error_message"] = str(e)
         log.exception(e)
     finally:
+        for table in tables:
+            table.close()
+        toreturn["timings"] = timings
         return toreturn
 
 
@@ -658,13 +2266,13 @@ def publish_index_html(
 
     # make an index.html using a template from the templates folder
     prms = dict(ontos=ontos, baseuri=baseuri, vocabs=vocabs)
-    templates_env = Environment(loader=FileSystemLoader(str(template_path)))
-    template = templates_env.get_template("template_index.html")
+    template = get_template(template_path, "template_index.html")
     outcome = template.render(prms)
     log.debug(f"> INDEX --> context for template == {prms}")
     outindexpath = outfolder + "/index.html"
-    with open(str(outindexpath), "w") as outfile:
-        outfile.write(outcome)
+    written = output_stats()
+    write_output(outindexpath, outcome, written)
+    return written
 
 
 def publish_vocabs(
@@ -675,6 +2283,12 @@ def publish_vocabs(
     logconf=None,
     ignore_folders=None,
     auto_camel_case=True,
+    workers=None,
+    manifest=None,
+    sources=None,
+    memory_budget=None,
+    page_size=None,
+    duplicates=None,
 ):
     enable_logging(logconf)
 
@@ -682,12 +2296,11 @@ def publish_vocabs(
     outfolder = nsfolder if outfolder is None else outfolder
     outfolder = Path(outfolder).resolve()
     nsfolder = Path(nsfolder).resolve()
+    workers = resolve_workers(workers)
+    page_size = resolve_page_size(page_size)
+    duplicates = resolve_duplicates(duplicates)
 
-    # Parse ignore_folders if it's a string
-    if isinstance(ignore_folders, str):
-        ignore_folders = [f.strip() for f in ignore_folders.split(",") if f.strip()]
-    elif ignore_folders is None:
-        ignore_folders = []
+    ignore_folders = parse_ignore_folders(ignore_folders)
 
     log.debug(
         f"publishing vocabs from '{nsfolder}' to '{outfolder}' while applying baseuri={baseuri}"
@@ -700,45 +2313,221 @@ def publish_vocabs(
     vocabs = dict()
     vocabs_in_err = set()
 
-    # run over nsfolder and process ontology files
-    for folder, dirs, nsfiles in os.walk(nsfolder, topdown=False, followlinks=True):
-        # Skip ignored folders
-        if should_ignore_path(folder, nsfolder, ignore_folders):
-            log.debug(f"Skipping ignored folder: {folder}")
-            continue
+    # collect the vocabulary files to process
+    if sources is None:
+        sources = discover_sources(nsfolder, ignore_folders)
+    jobs = dict()
+    estimates = dict()
+    for source in sources:
+        if source.kind == VOCABULARY:
+            log.debug(f"csv file {source.nskey} found in {nsfolder}")
+            estimates[source.nskey] = estimate_memory(nsfolder, source)
+            jobs[source.nskey] = (
+                baseuri,
+                nsfolder,
+                source.nssub,
+                source.nsname,
+                outfolder,
+                template_path,
+                auto_camel_case,
+                manifest_entry(manifest, source.nskey),
+                page_size,
+                duplicates,
+            )
 
-        for nsname in nsfiles:
-            if nsname.endswith(".csv"):
-                log.debug(f"csv file at {folder} - {nsname} when walking {nsfolder}")
-
-                nssub = Path(folder).relative_to(nsfolder)
-                nskey = f"{str(nssub)}/{nsname}"
-                nspub = vocabpub(
-                    baseuri,
-                    nsfolder,
-                    nssub,
-                    nsname,
-                    outfolder,
-                    template_path,
-                    auto_camel_case,
-                )
-                if nspub["error"]:
-                    log.error(f"Error processing vocabulary {nskey}")
-                    if "error_message" in nspub:
-                        log.error(f"Error details: {nspub['error_message']}")
-                    vocabs_in_err.add(nskey)
-                vocabs[nskey] = nspub
+    # process them (in parallel) keeping a stable order in the results
+    nskeys = sorted(jobs)
+    workers, isolated = plan_jobs(nskeys, estimates, workers, memory_budget)
+    log.info(f"Publishing {len(nskeys)} vocabularies using {workers} worker(s)")
+    results = run_jobs(vocabpub, [jobs[nskey] for nskey in nskeys], workers, isolated)
+    for index, (nskey, nspub) in enumerate(zip(nskeys, results)):
+        record_manifest_entry(manifest, nskey, nspub)
+        record_memory(nspub, estimates[nskey], index in isolated)
+        if nspub["error"]:
+            log.error(f"Error processing vocabulary {nskey}")
+            if "error_message" in nspub:
+                log.error(f"Error details: {nspub['error_message']}")
+            vocabs_in_err.add(nskey)
+        vocabs[nskey] = nspub
 
     if len(vocabs_in_err) > 0:
         log.warning(
             f"Failed to process {len(vocabs_in_err)} out of {len(vocabs)} vocabularies"
         )
-        for err_vocab in vocabs_in_err:
+        for err_vocab in sorted(vocabs_in_err):
             log.warning(f"  - {err_vocab}")
 
     return vocabs
 
 
+def is_enabled(value):
+    """Read a true/false action input (true/false, yes/no, 1/0, on/off)."""
+    return str(value).lower() in ("true", "1", "yes", "on")
+
+
+def resolve_workers(workers=None):
+    """Resolve the number of worker processes to use for publishing.
+
+    Args:
+        workers: Number of workers as int or string, None or "" for the CPU count
+
+    Returns:
+        The number of worker processes, at least 1
+    """
+    if workers is None or str(workers).strip() == "":
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _job_failure(e):
+    """Log an error the job did not trap itself, and make it the result of the job."""
+    log.exception(e)
+    return dict(error=True, error_message=f"Worker failure: {str(e)}")
+
+
+def _run_trapped(fn, *job):
+    """Run fn(*job) in-process, reporting what it raises as run_jobs does for workers."""
+    try:
+        return fn(*job)
+    except Exception as e:
+        return _job_failure(e)
+
+
+def _portable_record(record):
+    """Flatten a log record so it can be pickled back to the parent process."""
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+    return record
+
+
+def _run_logged(fn, *job):
+    """Run fn(*job) in a worker process while holding back its log records.
+
+    Returns:
+        Tuple of (result, records) with the records to be replayed by the parent
+    """
+    buffer = logging.handlers.BufferingHandler(capacity=sys.maxsize)
+    handlers, propagate = log.handlers, log.propagate
+    log.handlers, log.propagate = [buffer], False
+    try:
+        result = fn(*job)
+    finally:
+        log.handlers, log.propagate = handlers, propagate
+    return result, [_portable_record(record) for record in buffer.buffer]
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of this process, where the OS allows it (linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in MB, None if unknown."""
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, but bytes on macos
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_measured(fn, *job):
+    """Run fn(*job) and add the peak memory use of the process to its result."""
+    reset_peak_rss()
+    result = fn(*job)
+    result["memory"] = dict(peak_rss=peak_rss())
+    return result
+
+
+def _init_worker(template_cache, graph_cache, graph_cache_size, log_level):
+    """Give a worker process the same caches and log level as the parent process.
+
+    A forked worker inherits the logging config of the parent, a spawned one
+    starts without it, and would hold back the records of another level than
+    the parent logs.
+    """
+    log.setLevel(log_level)
+    use_template_cache(template_cache)
+    use_graph_cache(graph_cache, graph_cache_size)
+
+
+def _job_result(future):
+    """Wait for the result of a job in a worker process and replay its log records."""
+    try:
+        result, records = future.result()
+    except Exception as e:
+        # the job raising an error it did not trap, or the worker dying on us
+        result, records = _job_failure(e), []
+    for record in records:
+        log.handle(record)
+    return result
+
+
+def _worker_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(
+            template_cache_folder(),
+            *graph_cache_settings(),
+            log.getEffectiveLevel(),
+        ),
+    )
+
+
+def run_jobs(fn, jobs, workers=1, isolated=()):
+    """Run fn(*job) for each job, spreading them over worker processes.
+
+    The log lines of each job are emitted together once it is finished,
+    rather than interleaved with those of the jobs running next to it.
+    A job raising an error becomes a result with error set, whatever the
+    number of workers. The peak memory use of each job is added to its result.
+
+    Args:
+        fn: Module-level function to call, returning a result dict
+        jobs: List of argument tuples, one per call
+        workers: Number of worker processes, 1 runs everything in-process
+        isolated: Indexes of the jobs to run one by one, each in a process of its own,
+            after the others are done
+
+    Returns:
+        List of results in the same order as jobs
+    """
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    shared = [index for index in range(len(jobs)) if index not in isolated]
+    if workers <= 1 or len(shared) <= 1:
+        for index in shared:
+            results[index] = _run_trapped(_run_measured, fn, *jobs[index])
+    else:
+        with _worker_pool(min(workers, len(shared))) as pool:
+            futures = [
+                (index, pool.submit(_run_logged, _run_measured, fn, *jobs[index]))
+                for index in shared
+            ]
+            for index, future in futures:
+                results[index] = _job_result(future)
+    # the process goes away with the job, and gives all of its memory back
+    for index in sorted(isolated):
+        with _worker_pool(1) as pool:
+            future = pool.submit(_run_logged, _run_measured, fn, *jobs[index])
+            results[index] = _job_result(future)
+    return results
+
+
 def should_ignore_path(path, nsfolder, ignore_folders):
     """Check if a path should be ignored based on ignore_folders list.
 
@@ -774,8 +2563,164 @@ def should_ignore_path(path, nsfolder, ignore_folders):
     return False
 
 
+def parse_ignore_folders(ignore_folders):
+    """Turn the ignore_folders setting (list or comma-separated string) into a list."""
+    if isinstance(ignore_folders, str):
+        return [f.strip() for f in ignore_folders.split(",") if f.strip()]
+    if ignore_folders is None:
+        return []
+    return list(ignore_folders)
+
+
+class SourceFile(NamedTuple):
+    """A file found in the namespace folder, classified by what it gets published as."""
+
+    kind: str  # one of ONTOLOGY, DRAFT, VOCABULARY or MISC
+    nssub: Path  # folder holding the file, relative to the namespace folder
+    nsname: str  # name of the file
+
+    @property
+    def nskey(self):
+        return f"{str(self.nssub)}/{self.nsname}"
+
+    @property
+    def stem(self):
+        return Path(self.nsname).stem.replace("_draft", "")
+
+
+ONTOLOGY = "ontology"
+DRAFT = "draft"
+VOCABULARY = "vocabulary"
+MISC = "misc"
+
+
+def classify_source(nsname):
+    if nsname.endswith("_draft.ttl"):
+        return DRAFT
+    if nsname.endswith(".ttl"):
+        return ONTOLOGY
+    if nsname.endswith(".csv"):
+        return VOCABULARY
+    return MISC
+
+
+def discover_sources(nsfolder, ignore_folders=None):
+    """Walk the namespace folder once and classify all files found in it.
+
+    Symlinked folders are followed, unless they lead back into one of the
+    folders they are found in, which would make the walk go round forever.
+
+    Args:
+        nsfolder: The base namespace folder
+        ignore_folders: List (or comma-separated string) of folder patterns to ignore
+
+    Returns:
+        List of SourceFile entries, sorted by their nskey
+    """
+    nsfolder = Path(nsfolder).resolve()
+    ignore_folders = parse_ignore_folders(ignore_folders)
+
+    sources = []
+    for folder, dirs, nsfiles in os.walk(nsfolder, topdown=True, followlinks=True):
+        folder_real = Path(os.path.realpath(folder))
+        # prune (in place) the folders not to descend into
+        for dir in list(dirs):
+            dirpath = Path(folder) / dir
+            if should_ignore_path(dirpath, nsfolder, ignore_folders):
+                log.debug(f"Skipping ignored folder: {dirpath}")
+                dirs.remove(dir)
+            elif dirpath.is_symlink() and folder_real.is_relative_to(
+                os.path.realpath(dirpath)
+            ):
+                log.warning(f"Skipping symlink cycle at '{dirpath}'")
+                dirs.remove(dir)
+        dirs.sort()
+
+        nssub = Path(folder).relative_to(nsfolder)
+        for nsname in nsfiles:
+            sources.append(SourceFile(classify_source(nsname), nssub, nsname))
+
+    sources.sort(key=lambda source: source.nskey)
+    log.debug(f"discovered {len(sources)} files in '{nsfolder}'")
+    return sources
+
+
+# rough memory use of publishing an input: a worker with pylode and its background
+# ontologies loaded, plus MB per MB of input (measured on generated ontologies and
+# vocabularies, the pylode html dominates for ontologies, the csv rows kept in
+# memory for vocabularies, streamed vocabularies stay at the base)
+MEMORY_BASE = 80
+MEMORY_FACTORS = {ONTOLOGY: 250, DRAFT: 250, VOCABULARY: 11}
+
+
+def estimate_memory(nsfolder, source):
+    """Predict the peak memory use in MB of publishing a source file."""
+    size = (Path(nsfolder) / source.nssub / source.nsname).stat().st_size
+    if source.kind == VOCABULARY and size > VOCAB_STREAM_SIZE:
+        return MEMORY_BASE
+    return round(MEMORY_BASE + MEMORY_FACTORS.get(source.kind, 0) * size / 1024**2)
+
+
+def plan_jobs(nskeys, estimates, workers, memory_budget=None):
+    """Fit the jobs in a memory budget.
+
+    The inputs predicted to exceed the budget on their own are isolated, to be run
+    one by one in a subprocess of their own. The others run in parallel, with no
+    more workers than the budget allows for the largest of them.
+
+    Args:
+        nskeys: the keys of the inputs, in the order of the jobs
+        estimates: dict of the predicted memory use in MB per nskey
+        workers: the number of workers asked for
+        memory_budget: the memory budget in MB, None or "" for no budget
+
+    Returns:
+        Tuple of (workers, isolated) with the number of workers to use and
+        the indexes of the jobs to isolate
+    """
+    if memory_budget in (None, ""):
+        return workers, set()
+    memory_budget = int(memory_budget)
+    isolated = set()
+    largest = 0
+    for index, nskey in enumerate(nskeys):
+        if estimates[nskey] > memory_budget:
+            log.info(
+                f"{nskey} is predicted to use {estimates[nskey]} MB, "
+                f"over the budget of {memory_budget} MB, it runs in a process of its own"
+            )
+            isolated.add(index)
+        else:
+            largest = max(largest, estimates[nskey])
+    if largest > 0 and workers * largest > memory_budget:
+        fitting = max(1, memory_budget // largest)
+        log.info(
+            f"Reducing the workers from {workers} to {fitting} to fit inputs of up to "
+            f"{largest} MB in the budget of {memory_budget} MB"
+        )
+        workers = fitting
+    return workers, isolated
+
+
+def record_memory(nspub, estimate, isolated):
+    """Add the predicted memory use, and if it was isolated, to the result of an input."""
+    memory = nspub.setdefault("memory", dict())
+    memory["estimate"] = estimate
+    memory["isolated"] = isolated
+
+
 def publish_ontologies(
-    baseuri, nsfolder, outfolder, template_path, logconf=None, ignore_folders=None
+    baseuri,
+    nsfolder,
+    outfolder,
+    template_path,
+    logconf=None,
+    ignore_folders=None,
+    workers=None,
+    manifest=None,
+    sources=None,
+    memory_budget=None,
+    duplicates=None,
 ):
     enable_logging(logconf)
 
@@ -783,12 +2728,10 @@ def publish_ontologies(
     outfolder = nsfolder if outfolder is None else outfolder
     outfolder = Path(outfolder).resolve()
     nsfolder = Path(nsfolder).resolve()
+    workers = resolve_workers(workers)
+    duplicates = resolve_duplicates(duplicates)
 
-    # Parse ignore_folders if it's a string
-    if isinstance(ignore_folders, str):
-        ignore_folders = [f.strip() for f in ignore_folders.split(",") if f.strip()]
-    elif ignore_folders is None:
-        ignore_folders = []
+    ignore_folders = parse_ignore_folders(ignore_folders)
 
     log.debug(
         f"publishing ontologies from '{nsfolder}' to '{outfolder}' while applying baseuri={baseuri}"
@@ -800,27 +2743,41 @@ def publish_ontologies(
     ontos = dict()
     ontos_in_err = set()
 
-    # run over nsfolder and process ontology files
-    for folder, dirs, nsfiles in os.walk(nsfolder, topdown=False, followlinks=True):
-        # Skip ignored folders
-        if should_ignore_path(folder, nsfolder, ignore_folders):
-            log.debug(f"Skipping ignored folder: {folder}")
-            continue
+    # collect the ontology files to process
+    if sources is None:
+        sources = discover_sources(nsfolder, ignore_folders)
+    jobs = dict()
+    estimates = dict()
+    for source in sources:
+        if source.kind in (ONTOLOGY, DRAFT):
+            log.debug(f"ttl file {source.nskey} found in {nsfolder}")
+            estimates[source.nskey] = estimate_memory(nsfolder, source)
+            jobs[source.nskey] = (
+                baseuri,
+                nsfolder,
+                source.nssub,
+                source.nsname,
+                outfolder,
+                manifest_entry(manifest, source.nskey),
+                duplicates,
+            )
 
-        for nsname in nsfiles:
-            if nsname.endswith(".ttl"):
-                log.debug(f"ttl file at {folder} - {nsname} when walking {nsfolder}")
-                nssub = Path(folder).relative_to(nsfolder)
-                nskey = f"{str(nssub)}/{nsname}"
-                nspub = ontopub(baseuri, nsfolder, nssub, nsname, outfolder)
-                if bool(
-                    nspub.get("error")
-                ):  # if the error key is there and set to anything non-False
-                    log.error(f"Error processing ontology {nskey}")
-                    if "error_message" in nspub:
-                        log.error(f"Error details: {nspub['error_message']}")
-                    ontos_in_err.add(nskey)
-                ontos[nskey] = nspub
+    # process them (in parallel) keeping a stable order in the results
+    nskeys = sorted(jobs)
+    workers, isolated = plan_jobs(nskeys, estimates, workers, memory_budget)
+    log.info(f"Publishing {len(nskeys)} ontologies using {workers} worker(s)")
+    results = run_jobs(ontopub, [jobs[nskey] for nskey in nskeys], workers, isolated)
+    for index, (nskey, nspub) in enumerate(zip(nskeys, results)):
+        record_manifest_entry(manifest, nskey, nspub)
+        record_memory(nspub, estimates[nskey], index in isolated)
+        if bool(
+            nspub.get("error")
+        ):  # if the error key is there and set to anything non-False
+            log.error(f"Error processing ontology {nskey}")
+            if "error_message" in nspub:
+                log.error(f"Error details: {nspub['error_message']}")
+            ontos_in_err.add(nskey)
+        ontos[nskey] = nspub
 
     # copy any other stuff outside the actual pylode / ontology stuff
     publish_misc(baseuri, nsfolder, outfolder)
@@ -829,41 +2786,258 @@ def publish_ontologies(
         log.error(
             f"Failed to process {len(ontos_in_err)} out of {len(ontos)} ontologies"
         )
-        for err_onto in ontos_in_err:
+        for err_onto in sorted(ontos_in_err):
             log.error(f"  - {err_onto}")
         raise OntoPubException(ontos, ontos_in_err)
     return ontos
 
 
-def combine_ttls(outfolder):
+COPY_CHUNK = 1024 * 1024
+PREFIX_DECL = re.compile(
+    rb"^\s*(?:@prefix|(?i:prefix))\s+([^\s:]*):\s*<([^>]*)>\s*\.?\s*$"
+)
+
+
+def read_prefixes(ttl_path):
+    """Collect the prefix declarations of a ttl file, reading it line by line.
+
+    Args:
+        ttl_path (Path): the ttl file to scan
+
+    Returns:
+        dict: prefix name (bytes) to namespace IRI (bytes), the last declaration wins
+    """
+    prefixes = dict()
+    with open(ttl_path, "rb") as ttl_file:
+        for line in ttl_file:
+            match = PREFIX_DECL.match(line)
+            if match:
+                prefixes[match.group(1)] = match.group(2)
+    return prefixes
+
+
+def append_ttl(ttl_path, vocabs_path):
+    """Stream a vocabulary ttl onto the end of an ontology ttl.
+
+    The prefix declarations heading the vocabulary are dropped when the ontology
+    already declares the same prefix for the same namespace, the rest of the
+    file is copied in fixed size chunks without being held in memory.
+
+    Args:
+        ttl_path (Path): the ontology ttl to append to
+        vocabs_path (Path): the vocabulary ttl to append
+
+    Returns:
+        int: the number of prefix declarations that were dropped
+    """
+    prefixes = read_prefixes(ttl_path)
+    dropped = 0
+    with open(ttl_path, "rb+") as ttl_file, open(vocabs_path, "rb") as vocabs_file:
+        # make sure the vocabulary starts on a line of its own
+        ttl_file.seek(0, os.SEEK_END)
+        if ttl_file.tell() > 0:
+            ttl_file.seek(-1, os.SEEK_END)
+            if ttl_file.read(1) != b"\n":
+                ttl_file.write(b"\n")
+        # the prefix block heading the vocabulary, line by line
+        line = vocabs_file.readline()
+        while line:
+            match = PREFIX_DECL.match(line)
+            if match:
+                name, iri = match.groups()
+                if prefixes.get(name) == iri:
+                    dropped += 1
+                else:
+                    # new or redeclared, keep it so the vocabulary keeps its meaning
+                    prefixes[name] = iri
+                    ttl_file.write(line)
+            elif line.strip():
+                ttl_file.write(line)
+                break
+            line = vocabs_file.readline()
+        # and the bulk of it in chunks
+        shutil.copyfileobj(vocabs_file, ttl_file, COPY_CHUNK)
+    return dropped
+
+
+def write_ntriples(nt_path, ttl_paths, written=None):
+    """Write the triples of some ttl files to one N-Triples file.
+
+    Every ttl file is parsed and serialised on its own, N-Triples being a line based
+    format the parts can simply be concatenated. The blank nodes are labelled in
+    parse order, prefixed per part, and the lines of each part are sorted, so the
+    same ttl files always give the same file and an unchanged build leaves it untouched.
+
+    Args:
+        nt_path (Path): the N-Triples file to write
+        ttl_paths (list): the ttl files to include
+        written (dict): optional output_stats to count the file in
+    """
+    with output_file(nt_path, written, "wb") as nt_file:
+        for part, ttl_path in enumerate(ttl_paths):
+            graph = Graph()
+            graph.parse(ttl_path, format="turtle")
+            label_blank_nodes(graph, prefix=f"p{part}b")
+            lines = graph.serialize(format="nt", encoding="utf-8").splitlines(True)
+            nt_file.writelines(sorted(line for line in lines if line.strip()))
+
+
+def combine_ttls(outfolder, sources=None, check=False, ntriples=False):
     """Will combine all the ttl files in the outfolder into a single ttl file
 
     Args:
         outfolder (str): the folder to combine the ttl files from
+        sources (list): the discovered SourceFile entries, to avoid walking the outfolder
+        check (bool): parse every combined ttl file to check it is valid turtle
+        ntriples (bool): also write the combined triples to a name.nt file next to each ttl
+
+    Returns:
+        dict: per combined ttl file (relative to the outfolder) the result of
+            combining it, with the output_stats of the files written
     """
     ttl_files = []
-    for folder, dirs, nsfiles in os.walk(outfolder, topdown=False, followlinks=True):
-        for file in nsfiles:
-            if file.endswith(".ttl"):
-                # if file does not contain _vocabs then add it to the list
-                if not file.endswith("_vocab.ttl"):
-                    log.debug(msg=f"found an ontology ttl file {file} in {folder}")
-                    ttl_files.append({"folder": folder, "file": file})
+    if sources is not None:
+        for source in sources:
+            if source.kind in (ONTOLOGY, DRAFT):
+                folder = str(Path(outfolder) / source.nssub)
+                ttl_files.append({"folder": folder, "file": f"{source.stem}.ttl"})
+    else:
+        for folder, dirs, nsfiles in os.walk(
+            outfolder, topdown=False, followlinks=True
+        ):
+            for file in nsfiles:
+                if file.endswith(".ttl"):
+                    # if file does not contain _vocabs then add it to the list
+                    if not file.endswith("_vocab.ttl"):
+                        log.debug(msg=f"found an ontology ttl file {file} in {folder}")
+                        ttl_files.append({"folder": folder, "file": file})
     # loop over the ttl_files and check if there is another file with the same name but with _vocabs appedned to it and from the same folder
+    combined = dict()
     for ttl_file in ttl_files:
-        vocabs_file = ttl_file["file"].replace(".ttl", "_vocab.ttl")
-        vocabs_path = Path(ttl_file["folder"]) / vocabs_file
-        if vocabs_path.exists():
-            log.debug(msg=f"found vocabs file {vocabs_file} in {ttl_file['folder']}")
-            ttl_file["vocabs_file"] = vocabs_file
-            ttl_file["vocabs_path"] = vocabs_path
-            # read in contents of vocabs file and append them to the ttl file
-            with open(vocabs_path, "r") as vocabs_file:
-                vocabs_content = vocabs_file.read()
-            with open(Path(ttl_file["folder"]) / ttl_file["file"], "a") as ttl_file:
-                ttl_file.write(vocabs_content)
-            # delete the vocabs file
-            os.remove(path=vocabs_path)
+        ttl_path = Path(ttl_file["folder"]) / ttl_file["file"]
+        if not ttl_path.exists():
+            continue
+        key = ttl_path.relative_to(outfolder).as_posix()
+        result = dict(error=False, outputs=output_stats())
+        vocabs_path = ttl_path.with_name(ttl_file["file"].replace(".ttl", "_vocab.ttl"))
+        previous_path = previous_output(ttl_path)
+        try:
+            parts = [ttl_path]
+            if vocabs_path.exists():
+                log.debug(msg=f"found vocabs file {vocabs_path.name} in {ttl_file['folder']}")
+                parts.append(vocabs_path)
+            if ntriples:
+                # from the separate parts, so no graph ever holds the combined triples
+                write_ntriples(ttl_path.with_suffix(".nt"), parts, result["outputs"])
+            if vocabs_path in parts or previous_path.exists():
+                # stream the vocabs file onto a copy of the ttl file, which
+                # replaces the combined ttl of the previous build only if it
+                # differs from it, then delete the vocabs file
+                tmp = temp_output(ttl_path)
+                try:
+                    shutil.copyfile(ttl_path, tmp)
+                    if vocabs_path in parts:
+                        result["dropped_prefixes"] = append_ttl(tmp, vocabs_path)
+                    previous = previous_path if previous_path.exists() else None
+                    commit_output(tmp, ttl_path, result["outputs"], previous)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                if vocabs_path in parts:
+                    os.remove(path=vocabs_path)
+            if check:
+                Graph().parse(ttl_path, format="turtle")
+        except Exception as e:
+            log.error(f"failed to combine the ttl file '{key}': {e}")
+            result["error"] = True
+            result["error_message"] = str(e)
+        combined[key] = result
+    return combined
+
+
+COMPRESSIBLE = (".html", ".ttl")
+
+
+def compressed_siblings():
+    """Return the extensions of the precompressed siblings that can be written."""
+    return (".gz", ".br") if brotli is not None else (".gz",)
+
+
+def compress_file(path):
+    """Write the precompressed siblings of path, unless they are newer than it already.
+
+    Args:
+        path (str): the html or ttl file to compress
+
+    Returns:
+        dict: the size of the file and of each sibling, and whether it was (re)written
+    """
+    path = Path(path)
+    result = dict(error=False, written=[])
+    try:
+        stat = path.stat()
+        result["size"], mtime = stat.st_size, stat.st_mtime_ns
+        data = None
+        for suffix in compressed_siblings():
+            sibling = path.with_name(path.name + suffix)
+            if not sibling.exists() or sibling.stat().st_mtime_ns < mtime:
+                if data is None:
+                    data = path.read_bytes()
+                if suffix == ".gz":
+                    # no timestamp in the header, so unchanged files give the same bytes
+                    packed = gzip.compress(data, compresslevel=9, mtime=0)
+                else:
+                    packed = brotli.compress(data, quality=11)
+                write_output(sibling, packed)
+                result["written"].append(suffix)
+            result[suffix] = sibling.stat().st_size
+    except Exception as e:
+        log.error(f"failed to compress '{path}': {e}")
+        result["error"] = True
+        result["error_message"] = str(e)
+    return result
+
+
+def precompress(outfolder, workers=1):
+    """Write .gz (and .br with brotli installed) siblings of all html and ttl outputs.
+
+    Static hosts and CDNs can serve these as they are, rather than compressing
+    every response. Siblings newer than their file are kept.
+
+    Args:
+        outfolder (str): the folder holding the published files
+        workers (int): number of worker processes to compress with
+
+    Returns:
+        dict: per file (relative to the outfolder) the result of compressing it
+    """
+    paths = []
+    for folder, dirs, nsfiles in os.walk(outfolder, topdown=True, followlinks=True):
+        dirs[:] = sorted(dir for dir in dirs if not dir.startswith("."))
+        for nsname in sorted(nsfiles):
+            if nsname.endswith(COMPRESSIBLE):
+                paths.append(Path(folder) / nsname)
+    results = run_jobs(compress_file, [(str(path),) for path in paths], workers)
+
+    compressed = dict()
+    totals = defaultdict(int)
+    for path, result in zip(paths, results):
+        result.pop("memory", None)
+        compressed[path.relative_to(outfolder).as_posix()] = result
+        if result["error"]:
+            continue
+        for key in ("size", *compressed_siblings()):
+            totals[key] += result[key]
+    written = sum(1 for result in compressed.values() if result["written"])
+    log.info(
+        f"precompressed {written} out of {len(compressed)} html and ttl files"
+        f" ({totals['size'] / 1024:.0f} KB)"
+    )
+    for suffix in compressed_siblings():
+        if totals["size"]:
+            saved = 100 * (1 - totals[suffix] / totals["size"])
+            log.info(f"  {suffix}: {totals[suffix] / 1024:.0f} KB, {saved:.0f}% saved")
+    return compressed
 
 
 class OntoPubException(Exception):
@@ -876,36 +3050,83 @@ class OntoPubException(Exception):
         super().__init__(self.message)
 
 
-def main():
+def read_inputs(argv=None):
+    """Read the action inputs from the command line, falling back to the environment.
+
+    Args:
+        argv: the positional arguments as passed by the action, defaults to sys.argv[1:]
+
+    Returns:
+        dict: the inputs, converted to the types the build works with
+    """
     load_dotenv()
-    # read the action inputs
-    baseuri = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("BASE_URI")
-    nsfolder = sys.argv[2] if len(sys.argv) > 2 else "."
-    outfolder = sys.argv[3] if len(sys.argv) > 3 else None
-    logconf = sys.argv[4] if len(sys.argv) > 4 else os.environ.get("LOGCONF")
-    ignore_folders = (
-        sys.argv[5] if len(sys.argv) > 5 else os.environ.get("IGNORE_FOLDERS", "")
+    argv = sys.argv[1:] if argv is None else argv
+
+    def arg(position, env, default=None):
+        if len(argv) >= position:
+            return argv[position - 1]
+        return os.environ.get(env, default)
+
+    nsfolder = argv[1] if len(argv) > 1 else "."
+    outfolder = argv[2] if len(argv) > 2 else None
+    return dict(
+        baseuri=arg(1, "BASE_URI"),
+        nsfolder=nsfolder,
+        # default target folder to input folder
+        outfolder=nsfolder if outfolder is None else outfolder,
+        logconf=arg(4, "LOGCONF"),
+        ignore_folders=arg(5, "IGNORE_FOLDERS", ""),
+        auto_camel_case=is_enabled(arg(6, "AUTO_CAMEL_CASE", "true")),
+        workers=resolve_workers(arg(7, "WORKERS", "")),
+        check_ttl=is_enabled(arg(8, "CHECK_TTL", "false")),
+        ntriples=is_enabled(arg(9, "NTRIPLES", "false")),
+        template_cache=arg(10, "TEMPLATE_CACHE", ""),
+        graph_cache=arg(11, "GRAPH_CACHE", ""),
+        graph_cache_size=arg(12, "GRAPH_CACHE_SIZE", ""),
+        memory_budget=arg(13, "MEMORY_BUDGET", ""),
+        compress=is_enabled(arg(14, "COMPRESS", "false")),
+        vocab_page_size=resolve_page_size(arg(15, "VOCAB_PAGE_SIZE", "")),
+        duplicates=resolve_duplicates(arg(16, "DUPLICATES", "")),
+        combined_index=is_enabled(arg(17, "COMBINED_INDEX", "false")),
     )
-    auto_camel_case_str = (
-        sys.argv[6] if len(sys.argv) > 6 else os.environ.get("AUTO_CAMEL_CASE", "true")
+
+
+def build(inputs, template_path, manifest):
+    """Publish all ontologies and vocabularies, the index pages and the combined ttls.
+
+    Inputs unchanged since the build recorded in the manifest are not published
+    again, their results are taken from the manifest.
+
+    Args:
+        inputs (dict): the action inputs, as read by read_inputs
+        template_path: the folder with the templates
+        manifest (dict): the manifest of the previous build, updated in place
+
+    Returns:
+        tuple: the results for the ontologies, the vocabularies, the combined ttls,
+            the precompressed files and the combined indexes
+    """
+    baseuri, nsfolder, outfolder = (
+        inputs[key] for key in ("baseuri", "nsfolder", "outfolder")
     )
-    # Convert string to boolean
-    auto_camel_case = auto_camel_case_str.lower() in ("true", "1", "yes", "on")
-    # load in logconf
-    enable_logging(logconf)
-    myfolder = Path(__file__).parent.absolute()
-    template_path = myfolder / "templates"
-    log.debug(f"template_path={template_path} -- exists? {template_path.exists()}")
+    logconf, ignore_folders = inputs["logconf"], inputs["ignore_folders"]
 
-    if ignore_folders:
-        log.info(f"Configured to ignore folders: {ignore_folders}")
-    log.info(f"Auto camelCase conversion enabled: {auto_camel_case}")
+    # walk the nsfolder just once, all stages work from the same list of files
+    sources = discover_sources(nsfolder, ignore_folders)
 
-    # do the actual work
-    # TODO consider some way to deal with the possible OntoPubException
     try:
         ontos = publish_ontologies(
-            baseuri, nsfolder, outfolder, template_path, logconf, ignore_folders
+            baseuri,
+            nsfolder,
+            outfolder,
+            template_path,
+            logconf,
+            ignore_folders,
+            inputs["workers"],
+            manifest,
+            sources,
+            inputs["memory_budget"],
+            inputs["duplicates"],
         )
     except OntoPubException as ope:
         log.error("=" * 80)
@@ -916,6 +3137,8 @@ def main():
         for err_onto in ope.error_ontos:
             log.error(f"  - {err_onto}")
         log.error("=" * 80)
+        # the failed ontologies are no longer in the manifest, they get rebuilt
+        save_manifest(outfolder, manifest)
         raise
 
     vocabs = publish_vocabs(
@@ -925,67 +3148,246 @@ def main():
         template_path,
         logconf,
         ignore_folders,
-        auto_camel_case,
+        inputs["auto_camel_case"],
+        inputs["workers"],
+        manifest,
+        sources,
+        inputs["memory_budget"],
+        inputs["vocab_page_size"],
+        inputs["duplicates"],
     )
     log.debug(msg=f"ontos={ontos.keys()} -- vocabs={vocabs.keys()}")
 
     # function here that will make the index.html file with info concerning the ontologies and the vocabularies
-    publish_index_html(
+    index_outputs = publish_index_html(
         baseuri, nsfolder, outfolder, template_path, ontos, vocabs, logconf
     )
-    combine_ttls(outfolder)
+    publish_search_index(outfolder, ontos, vocabs)
+    combined = combine_ttls(
+        outfolder, sources, inputs["check_ttl"], inputs["ntriples"]
+    )
+    indexes = dict()
+    if inputs["combined_index"]:
+        indexes = publish_combined_index(
+            baseuri,
+            nsfolder,
+            outfolder,
+            template_path,
+            logconf,
+            ignore_folders,
+            inputs["workers"],
+            sources,
+        )
+    index = {"index.html": dict(outputs=index_outputs)}
+    totals = output_totals(ontos, vocabs, combined, indexes, index)
+    log.info(
+        f"{totals['changed']} output files changed ({totals['bytes'] / 1024:.0f} KB"
+        f" written), {totals['unchanged']} left untouched"
+    )
 
-    # crawl the outfolder and for each ttl file that does not contain _vocab or is the index file.
-    # create a line in the <head> of the index.html file that links to the ttl file
-    # line example <link
-    #  href="https://example.com/ontologies/ontology.ttl"
-    #  rel="describedby"
-    #  type="text/turtle"
-    # />
+    compressed = dict()
+    if inputs["compress"]:
+        compressed = precompress(outfolder, inputs["workers"])
+
+    # where did the time go
+    save_timing_report(outfolder, timing_report(ontos, vocabs))
+
+    save_manifest(outfolder, manifest)
+    return ontos, vocabs, combined, compressed, indexes
+
+
+def prepare_build(inputs):
+    """Set up logging and the caches for a build of the given inputs.
+
+    Returns:
+        tuple: the template folder and the manifest of the previous build
+    """
+    enable_logging(inputs["logconf"])
+    myfolder = Path(__file__).parent.absolute()
+    template_path = myfolder / "templates"
+    log.debug(f"template_path={template_path} -- exists? {template_path.exists()}")
+    use_template_cache(inputs["template_cache"])
+    use_graph_cache(inputs["graph_cache"], inputs["graph_cache_size"])
+
+    # reuse what is still valid from the previous build
+    manifest = load_manifest(
+        inputs["outfolder"],
+        build_config(
+            inputs["baseuri"],
+            template_path,
+            inputs["auto_camel_case"],
+            inputs["vocab_page_size"],
+            inputs["duplicates"],
+        ),
+    )
+
+    if inputs["ignore_folders"]:
+        log.info(f"Configured to ignore folders: {inputs['ignore_folders']}")
+    log.info(f"Auto camelCase conversion enabled: {inputs['auto_camel_case']}")
+    log.info(f"Number of worker processes: {inputs['workers']}")
+    if inputs["template_cache"]:
+        log.info(f"Compiled templates are cached in: {inputs['template_cache']}")
+    if inputs["graph_cache"]:
+        log.info(f"Parsed ontology graphs are cached in: {inputs['graph_cache']}")
+    if inputs["memory_budget"]:
+        log.info(f"Memory budget: {inputs['memory_budget']} MB")
+    if inputs["compress"]:
+        log.info(f"Writing precompressed {', '.join(compressed_siblings())} files")
+    if inputs["combined_index"]:
+        log.info("Writing a combined index.html in the folder of each ontology")
+    if inputs["duplicates"] != "copy":
+        log.info(f"Pages published twice are written as a {inputs['duplicates']}")
+    return template_path, manifest
 
-    for folder, dirs, nsfiles in os.walk(outfolder, topdown=False, followlinks=True):
-        for file in nsfiles:
-            if (
-                file.endswith(".html")
-                and not file.endswith("index.html")
-                and not file.endswith("_vocab.html")
-            ):
-                file_path = Path(folder) / file
-                with open(file_path, "r") as html_file:
-                    html_content = html_file.read()
-                    # add <link
-                    #  href="./{{file}}.ttl"
-                    #  rel="describedby"
-                    #  type="text/turtle"
-                    # />
-                    # to the head of the html file
-                    html_content = html_content.replace(
-                        "</head>",
-                        f'<link href="./{file.replace(".html", "")}.ttl" rel="describedby" type="text/turtle" /></head>',
-                    )
-                with open(file_path, "w") as html_file:
-                    html_file.write(html_content)
 
-    # function here that will genreate an index.html file with iframes for the ontology and for the possible vocabularies
-    # the following function is deprecated
-    # publish_combined_index(baseuri, nsfolder, outfolder, template_path, logconf)
+def main():
+    inputs = read_inputs()
+    template_path, manifest = prepare_build(inputs)
+
+    # do the actual work
+    ontos, vocabs, combined, compressed, indexes = build(
+        inputs, template_path, manifest
+    )
 
     # Check for errors in ontologies and vocabularies
     ontos_errors = [key for key, value in ontos.items() if value.get("error")]
     vocabs_errors = [key for key, value in vocabs.items() if value.get("error")]
+    ttl_errors = [key for key, value in combined.items() if value.get("error")]
+    gz_errors = [key for key, value in compressed.items() if value.get("error")]
+    index_errors = [key for key, value in indexes.items() if value.get("error")]
 
-    if ontos_errors or vocabs_errors:
+    if ontos_errors or vocabs_errors or ttl_errors or gz_errors or index_errors:
         log.error("Errors encountered during processing:")
         if ontos_errors:
             log.error(f"Ontologies with errors: {ontos_errors}")
         if vocabs_errors:
             log.error(f"Vocabularies with errors: {vocabs_errors}")
+        if ttl_errors:
+            log.error(f"Combined ttl files with errors: {ttl_errors}")
+        if gz_errors:
+            log.error(f"Files that failed to compress: {gz_errors}")
+        if index_errors:
+            log.error(f"Folders whose combined index failed: {index_errors}")
         sys.exit(1)  # Exit with a non-zero status code
 
     # set the action outputs
     print(f"::set-output name=ontologies::{ontos.keys()}")
     print(f"::set-output name=vocabs::{vocabs.keys()}")
+    print(f"::set-output name=timings::{Path(inputs['outfolder']) / TIMINGS_NAME}")
+
+
+WATCH_PORT = 8000
+WATCH_INTERVAL = 1.0  # seconds
+
+
+def source_snapshot(nsfolder, ignore_folders=None):
+    """Note the size and modification time of the ontologies and vocabularies.
+
+    Returns:
+        dict: (size, mtime in ns) per nskey
+    """
+    snapshot = dict()
+    for source in discover_sources(nsfolder, ignore_folders):
+        if source.kind not in (ONTOLOGY, DRAFT, VOCABULARY):
+            continue
+        try:
+            stat = (Path(nsfolder) / source.nskey).stat()
+        except FileNotFoundError:  # removed while walking
+            continue
+        snapshot[source.nskey] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def changed_sources(before, after):
+    """List the nskeys that were added, changed or removed between two snapshots."""
+    return sorted(
+        nskey
+        for nskey in before.keys() | after.keys()
+        if before.get(nskey) != after.get(nskey)
+    )
+
+
+def rebuild(inputs, template_path, manifest):
+    """Build again, keeping the watch going when an ontology fails to publish.
+
+    Returns:
+        tuple: the results as returned by build, None when the build failed
+    """
+    try:
+        return build(inputs, template_path, manifest)
+    except OntoPubException:
+        log.error("the failed ontologies are published again on their next change")
+        return None
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler that logs its requests at debug level."""
+
+    def log_message(self, format, *args):
+        log.debug(f"preview: {format % args}")
+
+
+def serve(outfolder, port=WATCH_PORT):
+    """Serve the output folder over http in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: the running server, shut it down when done
+    """
+    handler = partial(QuietHandler, directory=str(outfolder))
+    server = ThreadingHTTPServer(("127.0.0.1", int(port)), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"serving '{outfolder}' on http://127.0.0.1:{server.server_port}/")
+    return server
+
+
+def watch(argv=None, port=None, interval=None, rounds=None):
+    """Build once, then rebuild whenever an ontology or vocabulary changes.
+
+    The output folder is served over http meanwhile, so the result of an edit
+    can be previewed right away. Only the inputs changed since the previous
+    build are published again, the others are taken from the manifest.
+
+    Args:
+        argv: the action inputs, as for main, defaults to sys.argv[1:]
+        port: the port to serve on, defaults to $WATCH_PORT or 8000 (0 picks a free one)
+        interval: seconds between two polls, defaults to $WATCH_INTERVAL or 1
+        rounds: stop after this many polls, keeps watching when None
+    """
+    inputs = read_inputs(argv)
+    port = os.environ.get("WATCH_PORT", WATCH_PORT) if port is None else port
+    if interval is None:
+        interval = os.environ.get("WATCH_INTERVAL", WATCH_INTERVAL)
+    interval = float(interval)
+    nsfolder, ignore_folders = inputs["nsfolder"], inputs["ignore_folders"]
+    template_path, manifest = prepare_build(inputs)
+
+    rebuild(inputs, template_path, manifest)
+    snapshot = source_snapshot(nsfolder, ignore_folders)
+    server = serve(inputs["outfolder"], port)
+    log.info(f"watching '{nsfolder}' for changes, press Ctrl+C to stop")
+    try:
+        while rounds is None or rounds > 0:
+            time.sleep(interval)
+            rounds = None if rounds is None else rounds - 1
+            latest = source_snapshot(nsfolder, ignore_folders)
+            changed = changed_sources(snapshot, latest)
+            if not changed:
+                continue
+            log.info(f"changed: {', '.join(changed)}")
+            start = time.perf_counter()
+            rebuild(inputs, template_path, manifest)
+            log.info(f"rebuilt in {time.perf_counter() - start:.2f}s")
+            # the build may have written into the nsfolder itself
+            snapshot = source_snapshot(nsfolder, ignore_folders)
+    except KeyboardInterrupt:
+        log.info("stopped watching")
+    finally:
+        server.shutdown()
+        server.server_close()
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        watch(sys.argv[2:])
+    else:
+        main()
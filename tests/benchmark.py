@@ -0,0 +1,398 @@
+"""Benchmark the publishing stages on synthetic ontologies and vocabularies.
+
+Generates, for each size, an ontology with N classes and M properties next to
+a csv vocabulary of K concepts arranged in a BROADER/NARROWER tree, publishes
+them and times every stage. The rewrite of the pylode entity anchors is timed
+on its own as well, against the BeautifulSoup rewrite it replaced (when bs4 is
+installed), checking both give the same ids and hrefs. The timings are written
+as json and can be compared against a stored baseline to catch regressions:
+
+    python tests/benchmark.py --sizes small,medium --output bench.json
+    python tests/benchmark.py --baseline bench.json
+    python tests/benchmark.py --sizes huge
+"""
+import sys
+import re
+import csv
+import json
+import time
+import shutil
+import logging
+import logging.config
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+import yaml
+from jinja2 import Environment
+from pylode import OntPub
+from rdflib import Graph
+
+sys.path.append(str(Path(__file__).parent.parent))
+import entrypoint as ep
+
+
+log = logging.getLogger("benchmark")
+
+BASEURI = "https://example.org/pylode2pages-bench"
+TEMPLATES = str(Path(__file__).resolve().parent.parent / "templates")
+
+# name: (classes, properties, concepts, fan-out)
+SIZES = {
+    "tiny": (5, 10, 20, 3),
+    "small": (50, 100, 200, 5),
+    "medium": (200, 500, 1000, 10),
+    "large": (1000, 2000, 5000, 20),
+    "huge": (1000, 5000, 5000, 20),
+}
+
+ENTITY_ID = re.compile(r'<div class="property entity" id="([^"]*)"')
+TOC_HREF = re.compile(r'<a href="(#[^"]*)"')
+
+# the publish functions (re)apply a logging config, keep it quiet while timing
+QUIET_LOGCONF = """
+version: 1
+disable_existing_loggers: false
+formatters:
+  base:
+    format: "%(name)s: %(message)s"
+handlers:
+  stderr:
+    class: logging.StreamHandler
+    formatter: base
+    stream: ext://sys.stderr
+loggers:
+  benchmark:
+    level: INFO
+root:
+  level: WARNING
+  handlers: [stderr]
+"""
+
+
+def generate_ontology(path, classes, properties):
+    """Write a jinja-templated ontology with some classes and properties.
+
+    Args:
+        path (Path): the ttl file to write
+        classes (int): number of owl classes
+        properties (int): number of object and datatype properties, each with a domain
+    """
+    with open(path, "w", encoding="utf-8") as ttl:
+        ttl.write(
+            "@prefix ex:      <{{baseuri}}/{{name}}#> .\n"
+            "@prefix owl:     <http://www.w3.org/2002/07/owl#> .\n"
+            "@prefix rdfs:    <http://www.w3.org/2000/01/rdf-schema#> .\n"
+            "@prefix dcterms: <http://purl.org/dc/terms/> .\n\n"
+            "<{{baseuri}}/{{name}}>\n"
+            "    a owl:Ontology ;\n"
+            '    dcterms:title "Benchmark ontology" ;\n'
+            '    dcterms:modified "2024-01-01" .\n\n'
+        )
+        for i in range(classes):
+            parent = f"    rdfs:subClassOf ex:Class{(i - 1) // 2} ;\n" if i else ""
+            ttl.write(
+                f"ex:Class{i}\n    a owl:Class ;\n{parent}"
+                f'    rdfs:label "Class {i}"@en ;\n'
+                f'    rdfs:comment "The class number {i}."@en .\n\n'
+            )
+        for i in range(properties):
+            kind = "owl:ObjectProperty" if i % 2 else "owl:DatatypeProperty"
+            ttl.write(
+                f"ex:property{i}\n    a {kind} ;\n"
+                f"    rdfs:domain ex:Class{i % max(classes, 1)} ;\n"
+                f'    rdfs:label "property {i}"@en ;\n'
+                f'    rdfs:comment "The property number {i}."@en .\n\n'
+            )
+
+
+def generate_vocabulary(path, concepts, fanout):
+    """Write a csv vocabulary with its concepts in a BROADER/NARROWER tree.
+
+    Args:
+        path (Path): the csv file to write
+        concepts (int): number of concepts
+        fanout (int): number of narrower concepts of each concept
+    """
+    with open(path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(
+            [
+                "ID",
+                "DATE",
+                "PREFLABEL_EN",
+                "DEFINITION_EN",
+                "ALTLABEL_EN",
+                "BROADER",
+                "NARROWER",
+            ]
+        )
+        for i in range(concepts):
+            broader = f"[{(i - 1) // fanout}]" if i else ""
+            last = min((i + 1) * fanout + 1, concepts)
+            children = [str(child) for child in range(i * fanout + 1, last)]
+            narrower = f"[{';'.join(children)}]" if children else ""
+            writer.writerow(
+                [
+                    i,
+                    "2024-01-01",
+                    f"Concept {i}",
+                    f"The concept number {i}.",
+                    f"concept {i}",
+                    broader,
+                    narrower,
+                ]
+            )
+
+
+def generate_nsfolder(nsfolder, classes, properties, concepts, fanout):
+    """Fill a namespace folder with an ontology and its vocabulary.
+
+    Returns:
+        Path: the namespace folder
+    """
+    nsfolder = Path(nsfolder)
+    nsfolder.mkdir(parents=True, exist_ok=True)
+    generate_ontology(nsfolder / "bench.ttl", classes, properties)
+    generate_vocabulary(nsfolder / "bench.csv", concepts, fanout)
+    return nsfolder
+
+
+def pylode_page(ttl_path):
+    """Make the pylode html page of a generated ontology, before any rewrite.
+
+    Returns:
+        str: the html as pylode made it
+    """
+    template = Environment().from_string(Path(ttl_path).read_text(encoding="utf-8"))
+    graph = Graph(bind_namespaces="core").parse(
+        data=template.render(baseuri=BASEURI, name="bench"), format="turtle"
+    )
+    with tempfile.TemporaryDirectory(prefix="pylode2pages-bench-") as workfolder:
+        html_path = Path(workfolder) / "bench.html"
+        OntPub(graph).make_html(destination=html_path, include_css=False)
+        return html_path.read_text(encoding="utf-8")
+
+
+def soup_property_anchors(html):
+    """The BeautifulSoup rewrite of the entity anchors that rewrite_property_anchors replaced."""
+    import bs4
+
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    toc_div = soup.find("div", id="toc")
+    for div in soup.find_all("div", class_="property entity"):
+        try:
+            for th in div.find_all("th"):
+                if th.text == "IRI":
+                    iri = th.find_next("td").find("code").text
+                    previous_id = div["id"]
+                    for a in toc_div.find_all("a"):
+                        if a["href"] == "#" + previous_id:
+                            a["href"] = "#" + iri.split("#")[1]
+                    div["id"] = iri.split("#")[1]
+        except Exception:
+            pass
+    return str(soup)
+
+
+def anchors(html):
+    """List the ids of the entity divs and the hrefs of the links of a page."""
+    return ENTITY_ID.findall(html), TOC_HREF.findall(html)
+
+
+def timed(timings, stage, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = round(time.perf_counter() - start, 4)
+    log.info(f"{stage}: {timings[stage]:.3f}s")
+    return result
+
+
+def inject_describedby_links(outfolder, sources):
+    """Run the describedby head injection over every published ontology page."""
+    for source in sources:
+        if source.kind not in (ep.ONTOLOGY, ep.DRAFT):
+            continue
+        html_path = Path(outfolder) / source.nssub / f"{source.stem}.html"
+        html = html_path.read_text(encoding="utf-8")
+        ep.add_describedby_link(html, f"{source.stem}.ttl")
+
+
+def rewrite_anchors(timings, html):
+    """Time both rewrites of the anchors on a pylode page, the BeautifulSoup one if installed."""
+    rewritten = timed(
+        timings, "rewrite_property_anchors", ep.rewrite_property_anchors, html
+    )
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        log.info("bs4 is not installed, no comparison with the BeautifulSoup rewrite")
+        return
+    souped = timed(
+        timings, "rewrite_property_anchors_bs4", soup_property_anchors, html
+    )
+    if anchors(rewritten) != anchors(souped):
+        raise AssertionError("the rewrites do not give the same ids and hrefs")
+
+
+def run_anchors(classes, properties):
+    """Time the rewrites of the anchors on the page of a generated ontology.
+
+    Returns:
+        dict: seconds spent per rewrite
+    """
+    log.info(f"anchors: {classes} classes, {properties} properties")
+    with tempfile.TemporaryDirectory(prefix="pylode2pages-bench-") as workfolder:
+        ttl_path = Path(workfolder) / "bench.ttl"
+        generate_ontology(ttl_path, classes, properties)
+        html = pylode_page(ttl_path)
+    timings = dict()
+    rewrite_anchors(timings, html)
+    return timings
+
+
+def run_size(size, workers=1):
+    """Publish the synthetic inputs of one size and time each stage.
+
+    Returns:
+        dict: seconds spent per stage
+    """
+    classes, properties, concepts, fanout = SIZES[size]
+    log.info(
+        f"size {size}: {classes} classes, {properties} properties, {concepts} concepts"
+    )
+    workfolder = Path(tempfile.mkdtemp(prefix=f"pylode2pages-bench-{size}-"))
+    try:
+        nsfolder = generate_nsfolder(
+            workfolder / "in", classes, properties, concepts, fanout
+        )
+        outfolder = str(workfolder / "out")
+        logconf = workfolder / "logconf.yml"
+        logconf.write_text(QUIET_LOGCONF)
+        sources = ep.discover_sources(nsfolder)
+        timings = dict()
+        ontos = timed(
+            timings,
+            "publish_ontologies",
+            ep.publish_ontologies,
+            BASEURI,
+            str(nsfolder),
+            outfolder,
+            TEMPLATES,
+            logconf=str(logconf),
+            workers=workers,
+            sources=sources,
+        )
+        vocabs = timed(
+            timings,
+            "publish_vocabs",
+            ep.publish_vocabs,
+            BASEURI,
+            str(nsfolder),
+            outfolder,
+            TEMPLATES,
+            logconf=str(logconf),
+            workers=workers,
+            sources=sources,
+        )
+        timed(
+            timings,
+            "publish_index_html",
+            ep.publish_index_html,
+            BASEURI,
+            str(nsfolder),
+            outfolder,
+            TEMPLATES,
+            ontos,
+            vocabs,
+            str(logconf),
+        )
+        timed(timings, "combine_ttls", ep.combine_ttls, outfolder, sources)
+        timed(
+            timings,
+            "add_describedby_link",
+            inject_describedby_links,
+            outfolder,
+            sources,
+        )
+        rewrite_anchors(timings, pylode_page(nsfolder / "bench.ttl"))
+        return timings
+    finally:
+        shutil.rmtree(workfolder, ignore_errors=True)
+
+
+def run_benchmark(sizes, workers=1):
+    """Time all stages for each of the sizes.
+
+    Returns:
+        dict: the environment the benchmark ran in and the timings per size
+    """
+    return dict(
+        python=platform.python_version(),
+        pylode=ep.plv,
+        workers=workers,
+        sizes={size: run_size(size, workers) for size in sizes},
+    )
+
+
+def compare(results, baseline, tolerance=0.25, noise=0.05):
+    """Find the stages that got slower than in the baseline.
+
+    Args:
+        results (dict): the benchmark results
+        baseline (dict): earlier benchmark results
+        tolerance (float): relative slowdown that is still accepted
+        noise (float): absolute slowdown in seconds that is always accepted
+
+    Returns:
+        list: (size, stage, baseline seconds, seconds) for every regression
+    """
+    regressions = []
+    for size, timings in results["sizes"].items():
+        before = baseline.get("sizes", {}).get(size, {})
+        for stage, seconds in timings.items():
+            if stage not in before:
+                continue
+            slower = seconds - before[stage]
+            if slower > before[stage] * tolerance and slower > noise:
+                regressions.append((size, stage, before[stage], seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default="small,medium",
+        help=f"comma-separated sizes to run, out of {', '.join(SIZES)}",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="worker processes to publish with"
+    )
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--baseline", help="json file of earlier results to compare")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="accepted relative slowdown"
+    )
+    args = parser.parse_args(argv)
+    logging.config.dictConfig(yaml.safe_load(QUIET_LOGCONF))
+
+    sizes = [size.strip() for size in args.sizes.split(",")]
+    results = run_benchmark(sizes, args.workers)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        log.info(f"results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r") as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for size, stage, before, seconds in regressions:
+            log.error(f"{stage} ({size}) got slower: {before:.3f}s -> {seconds:.3f}s")
+        if regressions:
+            return 1
+        log.info(f"no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,16 @@
 import sys
 import os
 from pathlib import Path
+import json
 import logging
+import logging.handlers
 import pytest
 import shutil
+import gzip
+import json
+from urllib.request import urlopen
 from dotenv import load_dotenv
+from rdflib import Graph, RDF, SKOS
 from assert_outcome import assert_result
 
 sys.path.append(str(Path(__file__).parent.parent))
@@ -22,6 +28,16 @@ def enable_test_logging():
         log.info(f"Logging enabled according to config in {logconf}")
 
 
+def without_build_stats(results):
+    """Drop the timings and memory use, which differ from run to run, from publish results."""
+    return {
+        nskey: {
+            key: value for key, value in nspub.items() if key not in ep.BUILD_STATS
+        }
+        for nskey, nspub in results.items()
+    }
+
+
 def run_single_test(testfile):
     sys.exit(pytest.main(["-v", "-s", testfile]))
 
@@ -123,6 +139,9 @@ def test_ignore_folders():
     assert not any(
         "should-ignore" in key for key in ontos.keys()
     ), "should-ignore folder should be ignored"
+    assert not any(
+        "should-ignore" in key for key in vocabs.keys()
+    ), "should-ignore folder should be ignored for vocabularies too"
 
     log.info("ignore_folders test passed successfully")
 
@@ -238,5 +257,1183 @@ def test_csv_id_validation():
     log.info("CSV ID validation test passed successfully")
 
 
+def test_parallel_ontologies(tmp_path):
+    enable_test_logging()
+    log.info("Testing parallel publishing of ontologies")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    baseuri = "https://example.org/pylode2pages-test"
+
+    results = dict()
+    for workers in (1, 2):
+        outfolder = tmp_path / f"parallel-{workers}-out"
+        results[workers] = ep.publish_ontologies(
+            baseuri, str(nsfolder), str(outfolder), "templates", workers=workers
+        )
+        assert_result(baseuri, outfolder, results[workers])
+
+    # same results, in the same (sorted) order, regardless of the number of workers
+    assert list(results[1].keys()) == sorted(results[1].keys())
+    assert list(results[1].keys()) == list(results[2].keys())
+    for nskey in results[1]:
+        assert results[1][nskey]["title"] == results[2][nskey]["title"]
+        assert results[1][nskey]["relref"] == results[2][nskey]["relref"]
+
+    assert ep.resolve_workers("3") == 3
+    assert ep.resolve_workers("") == (os.cpu_count() or 1)
+    log.info("parallel ontologies test passed successfully")
+
+
+def fail_on_odd(number):
+    if number % 2:
+        raise ValueError(f"odd number {number}")
+    return dict(error=False, number=number)
+
+
+def test_run_jobs_errors():
+    enable_test_logging()
+    log.info("Testing jobs raising an error are reported alike by any number of workers")
+    jobs = [(number,) for number in range(4)]
+    results = dict()
+    for workers in (1, 2):
+        results[workers] = [
+            {key: value for key, value in result.items() if key != "memory"}
+            for result in ep.run_jobs(fail_on_odd, jobs, workers)
+        ]
+    assert results[1] == results[2]
+    assert results[1][1] == dict(error=True, error_message="Worker failure: odd number 1")
+    assert results[1][2] == dict(error=False, number=2)
+    log.info("run jobs errors test passed successfully")
+
+
+def test_parallel_vocabs(tmp_path):
+    enable_test_logging()
+    log.info("Testing parallel publishing of vocabularies")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    baseuri = "https://example.org/pylode2pages-test"
+
+    results = dict()
+    for workers in (1, 2):
+        outfolder = tmp_path / f"parallel-{workers}-out"
+        results[workers] = ep.publish_vocabs(
+            baseuri, str(nsfolder), str(outfolder), "templates", workers=workers
+        )
+    assert list(results[1].keys()) == list(results[2].keys())
+    assert without_build_stats(results[1]) == without_build_stats(results[2])
+    for csv_file in nsfolder.glob("*.csv"):
+        html_name = csv_file.name.replace("_draft.csv", ".csv").replace(
+            ".csv", "_vocab.html"
+        )
+        assert (tmp_path / "parallel-1-out" / html_name).read_text() == (
+            tmp_path / "parallel-2-out" / html_name
+        ).read_text(), f"{html_name} should not depend on the number of workers"
+
+    # the log lines of the worker processes are replayed per vocabulary
+    outfolder = (tmp_path / "parallel-2-out").resolve()
+    names = sorted(csv_file.name for csv_file in nsfolder.glob("*.csv"))
+    jobs = [
+        (baseuri, nsfolder, Path("."), name, outfolder, "templates", True)
+        for name in names
+    ]
+    buffer = logging.handlers.BufferingHandler(capacity=10000)
+    ep.log.addHandler(buffer)
+    try:
+        ep.run_jobs(ep.vocabpub, jobs, 2)
+    finally:
+        ep.log.removeHandler(buffer)
+    started = [
+        record.getMessage()
+        for record in buffer.buffer
+        if record.getMessage().startswith("vocab to process")
+    ]
+    assert started == [f"vocab to process: ./{name} in {nsfolder}" for name in names]
+    log.info("parallel vocabs test passed successfully")
+
+
+def test_spawned_worker_logging(tmp_path, monkeypatch):
+    enable_test_logging()
+    log.info("Testing spawned worker processes log at the level of the parent")
+    import multiprocessing
+    from functools import partial
+
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(
+        ep, "ProcessPoolExecutor", partial(ep.ProcessPoolExecutor, mp_context=spawn)
+    )
+    names = ["onto-one_draft.csv", "test_quotes.csv"]
+    jobs = [
+        (baseuri, nsfolder, Path("."), name, outfolder, "templates", True)
+        for name in names
+    ]
+    buffer = logging.handlers.BufferingHandler(capacity=10000)
+    level = ep.log.level
+    ep.log.setLevel(logging.INFO)
+    ep.log.addHandler(buffer)
+    try:
+        results = ep.run_jobs(ep.vocabpub, jobs, 2)
+    finally:
+        ep.log.removeHandler(buffer)
+        ep.log.setLevel(level)
+    assert not any(result["error"] for result in results)
+    validated = [
+        record.getMessage()
+        for record in buffer.buffer
+        if record.getMessage().startswith("Validated")
+    ]
+    assert len(validated) == len(names), "the info records of the workers are replayed"
+    assert not any(record.levelno < logging.INFO for record in buffer.buffer)
+    log.info("spawned worker logging test passed successfully")
+
+
+def test_incremental_rebuild(tmp_path):
+    enable_test_logging()
+    log.info("Testing incremental rebuilds based on the build manifest")
+    parent = Path(__file__).resolve().parent
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    shutil.copytree(parent / "new_in", nsfolder)
+    baseuri = "https://example.org/pylode2pages-test"
+
+    def build():
+        config = ep.build_config(baseuri, "templates", True)
+        manifest = ep.load_manifest(outfolder, config)
+        try:
+            ontos = ep.publish_ontologies(
+                baseuri, str(nsfolder), str(outfolder), "templates", manifest=manifest
+            )
+        except ep.OntoPubException:
+            # as main does
+            ep.save_manifest(outfolder, manifest)
+            raise
+        vocabs = ep.publish_vocabs(
+            baseuri, str(nsfolder), str(outfolder), "templates", manifest=manifest
+        )
+        ep.combine_ttls(str(outfolder))
+        ep.save_manifest(outfolder, manifest)
+        return without_build_stats(ontos), without_build_stats(vocabs)
+
+    def mtimes():
+        return {
+            path.name: path.stat().st_mtime_ns for path in outfolder.glob("*.html")
+        }
+
+    ontos, vocabs = build()
+    assert (outfolder / ep.MANIFEST_NAME).exists(), "manifest should be written"
+    first = mtimes()
+
+    # nothing changed: same results, no outputs rewritten, the manifest included
+    manifest_mtime = (outfolder / ep.MANIFEST_NAME).stat().st_mtime_ns
+    assert build() == (ontos, vocabs)
+    assert mtimes() == first
+    assert (outfolder / ep.MANIFEST_NAME).stat().st_mtime_ns == manifest_mtime
+
+    # a changed vocabulary gets rebuilt together with its ontology, nothing else,
+    # and the ontology page it did not change is left untouched
+    with open(nsfolder / "onto-two.csv", "a") as csvfile:
+        csvfile.write("5,2024-01-01,Leg,a limb,,[4],\n")
+    assert build() == (ontos, vocabs)
+    changed = {name for name, mtime in mtimes().items() if first[name] != mtime}
+    assert changed == {"onto-two_vocab.html"}
+    for name in ("onto-one", "onto-two"):
+        html = (outfolder / f"{name}.html").read_text()
+        link = f'<link href="./{name}.ttl" rel="describedby" type="text/turtle" />'
+        assert html.count(link) == 1, f"one describedby link expected in {name}.html"
+
+    # a broken ontology fails the build, leaving its published ttl in place,
+    # and is no longer in the manifest, together with the vocabulary it pairs with
+    ttl_path = nsfolder / "onto-one.ttl"
+    source = ttl_path.read_text()
+    published = (outfolder / "onto-one.ttl").read_text()
+    ttl_path.write_text(source + "\nthis is not turtle\n")
+    with pytest.raises(ep.OntoPubException):
+        build()
+    assert (outfolder / "onto-one.ttl").read_text() == published
+    with open(outfolder / ep.MANIFEST_NAME) as manifest_file:
+        inputs = json.load(manifest_file)["inputs"]
+    assert "./onto-one.ttl" not in inputs
+    assert "./onto-one_draft.csv" not in inputs
+    assert "./onto-two.ttl" in inputs
+
+    # once repaired, it gets built again
+    ttl_path.write_text(source)
+    assert build() == (ontos, vocabs)
+    assert (outfolder / "onto-one.ttl").read_text() == published
+    assert not list(outfolder.glob(".*.ttl*")), "no stray files should be left"
+
+    # other build settings invalidate the whole manifest
+    config = ep.build_config("https://example.org/other", "templates", True)
+    assert ep.load_manifest(outfolder, config)["inputs"] == dict()
+    log.info("incremental rebuild test passed successfully")
+
+
+def test_write_output(tmp_path):
+    enable_test_logging()
+    log.info("Testing outputs are only rewritten when their content changes")
+    parent = Path(__file__).resolve().parent
+    outfolder = tmp_path / "out"
+    outfolder.mkdir()
+    path = outfolder / "page.html"
+
+    written = ep.output_stats()
+    assert ep.write_output(path, "<p>one</p>", written) == 10
+    mtime = path.stat().st_mtime_ns
+    os.utime(path, ns=(mtime - 10**9, mtime - 10**9))
+    mtime = path.stat().st_mtime_ns
+    assert ep.write_output(path, "<p>one</p>", written) == 0
+    with ep.output_file(path, written) as out:
+        out.write("<p>one</p>")
+    assert path.stat().st_mtime_ns == mtime, "identical content is not written"
+    assert ep.write_output(path, b"<p>two</p>", written) == 10
+    assert path.read_text() == "<p>two</p>"
+    assert written == dict(changed=2, unchanged=2, bytes=20)
+    assert not [p.name for p in outfolder.iterdir() if p.name != "page.html"]
+
+    # a failed write leaves the output as it was
+    with pytest.raises(ValueError):
+        with ep.output_file(path) as out:
+            out.write("<p>half")
+            raise ValueError("rendering failed")
+    assert path.read_text() == "<p>two</p>"
+    assert [p.name for p in outfolder.iterdir()] == ["page.html"]
+
+    # the combined ttl of the previous build is kept when combining gives the same
+    nsfolder = parent / "new_in"
+    baseuri = "https://example.org/pylode2pages-test"
+    sources = ep.discover_sources(nsfolder)
+
+    def build():
+        ep.publish_ontologies(baseuri, str(nsfolder), str(outfolder), "templates")
+        ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+        return ep.combine_ttls(str(outfolder), sources)
+
+    combined = build()
+    assert combined["onto-two.ttl"]["outputs"]["changed"] == 1
+    assert (outfolder / "pylode.css").exists(), "the pages link a shared pylode.css"
+    ttl = outfolder / "onto-two.ttl"
+    content, mtime = ttl.read_text(), ttl.stat().st_mtime_ns
+    combined = build()
+    assert combined["onto-two.ttl"]["outputs"] == dict(changed=0, unchanged=1, bytes=0)
+    assert ttl.stat().st_mtime_ns == mtime
+    assert not ep.previous_output(ttl).exists()
+    assert ttl.read_text() == content
+    log.info("write output test passed successfully")
+
+
+@pytest.mark.parametrize("duplicates", ep.DUPLICATES)
+def test_duplicates(tmp_path, duplicates):
+    enable_test_logging()
+    log.info(f"Testing pages published twice are written as a {duplicates}")
+    parent = Path(__file__).resolve().parent
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    (nsfolder / "sub").mkdir(parents=True)
+    shutil.copy(parent / "new_in" / "onto-one.ttl", nsfolder / "sub")
+    (nsfolder / "terms.csv").write_text(
+        "ID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n"
+        "one,2024-01-01,One,the first,,,\n",
+        encoding="utf-8",
+    )
+    baseuri = "https://example.org/pylode2pages-test"
+    for publish in (ep.publish_ontologies, ep.publish_vocabs):
+        publish(
+            baseuri, str(nsfolder), str(outfolder), "templates", duplicates=duplicates
+        )
+
+    # one stylesheet, linked by its path relative to each page
+    stylesheet = outfolder / "pylode.css"
+    for css in outfolder.rglob("pylode.css"):
+        assert css == stylesheet or os.path.samefile(css, stylesheet)
+    page = outfolder / "sub" / "onto-one.html"
+    assert 'href="../pylode.css" rel="stylesheet"' in page.read_text()
+
+    again = outfolder / "sub" / "onto-one" / "onto-one.html"
+    vocab = outfolder / "terms_vocab.html"
+    backup = outfolder / "sub" / "onto-one.ttl.bak"
+    if duplicates == "copy":
+        assert 'href="../../pylode.css" rel="stylesheet"' in again.read_text()
+        assert vocab.read_text() == (outfolder / "terms" / "terms_vocab.html").read_text()
+    elif duplicates == "hardlink":
+        assert os.path.samefile(again, page)
+        assert os.path.samefile(vocab, outfolder / "terms" / "terms_vocab.html")
+        assert os.path.samefile(backup, nsfolder / "sub" / "onto-one.ttl")
+    elif duplicates == "symlink":
+        assert os.readlink(again) == "../onto-one.html"
+        assert os.readlink(vocab) == "terms/terms_vocab.html"
+        # the linked page finds the stylesheet from its own folder
+        assert os.readlink(outfolder / "sub" / "pylode.css") == "../pylode.css"
+    else:
+        assert 'url=../onto-one.html"' in again.read_text()
+        assert 'location.replace("terms/terms_vocab.html"' in vocab.read_text()
+    assert not backup.is_symlink()
+    assert not (outfolder / "sub" / "onto-one" / "pylode.css").exists()
+
+    # published again, the links are left as they are
+    vocabs = ep.publish_vocabs(
+        baseuri, str(nsfolder), str(outfolder), "templates", duplicates=duplicates
+    )
+    assert vocabs["./terms.csv"]["outputs"]["changed"] == 0
+    log.info("duplicates test passed successfully")
+
+
+def test_pylode_html():
+    enable_test_logging()
+    log.info("Testing the pylode stylesheet is linked instead of inlined")
+
+    class Page:
+        def __init__(self, html):
+            self.html = html
+
+        def make_html(self, include_css=True):
+            return self.html
+
+    # whatever the whitespace around the inlined stylesheet
+    html = "<html><head>\n<style>  body {}\n</style>\n</head><body></body></html>"
+    linked = ep.pylode_html(Page(html), "../pylode.css")
+    assert "<style>" not in linked
+    assert ep.PYLODE_CSS_LINK.format(href="../pylode.css") + "\n</head>" in linked
+    # without one to swap the page is kept as it is
+    html = "<html><head></head><body><style>p {}</style></body></html>"
+    assert ep.pylode_html(Page(html), "pylode.css") == html
+    log.info("pylode html test passed successfully")
+
+
+def test_combined_index(tmp_path):
+    enable_test_logging()
+    log.info("Testing the combined index of the ontology and vocabulary of each folder")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    ep.publish_ontologies(baseuri, str(nsfolder), str(outfolder), "templates")
+    ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+
+    combined = ep.publish_combined_index(
+        baseuri, str(nsfolder), str(outfolder), "templates", workers=2
+    )
+    assert list(combined) == [
+        "emobonOntology",
+        "onto-one",
+        "onto-two",
+        "standalone_vocab",
+        "test_quotes",
+    ]
+    assert not any(result["error"] for result in combined.values())
+
+    both = (outfolder / "onto-two" / "index.html").read_text()
+    assert 'href="onto-two.html"' in both
+    assert 'href="onto-two_vocab.html"' in both
+    assert f"<code>{baseuri}/onto-two/onto-two_vocab.html</code>" in both
+    # the draft vocabulary shares the folder of its ontology
+    draft = (outfolder / "onto-one" / "index.html").read_text()
+    assert 'href="onto-one.html"' in draft and 'href="onto-one_vocab.html"' in draft
+    alone = (outfolder / "standalone_vocab" / "index.html").read_text()
+    assert "Ontology</sup>" not in alone
+    assert 'href="standalone_vocab_vocab.html"' in alone
+
+    # unchanged pages are rendered again, but not written
+    combined = ep.publish_combined_index(
+        baseuri, str(nsfolder), str(outfolder), "templates", workers=1
+    )
+    assert ep.output_totals(combined)["changed"] == 0
+    log.info("combined index test passed successfully")
+
+
+def test_discover_sources(tmp_path):
+    enable_test_logging()
+    log.info("Testing the discovery of source files")
+    parent = Path(__file__).resolve().parent
+    nsfolder = tmp_path / "in"
+    shutil.copytree(parent / "ignore-test", nsfolder)
+    shutil.copy(parent / "new_in" / "onto-one_draft.csv", nsfolder / "should-process")
+    (nsfolder / "CNAME").write_text("example.org")
+    # a symlink pointing back up the tree must not make the walk go round forever
+    os.symlink("..", nsfolder / "should-process" / "loop")
+
+    sources = ep.discover_sources(nsfolder, "should-ignore")
+    assert [(s.kind, s.nskey) for s in sources] == [
+        (ep.MISC, "./CNAME"),
+        (ep.ONTOLOGY, "should-process/onto-one.ttl"),
+        (ep.VOCABULARY, "should-process/onto-one_draft.csv"),
+    ]
+    assert sources[2].stem == "onto-one"
+    assert ep.classify_source("onto_draft.ttl") == ep.DRAFT
+    log.info("discover sources test passed successfully")
+
+
+def test_rewrite_property_anchors():
+    enable_test_logging()
+    log.info("Testing the rewrite of the pylode entity anchors")
+    entity = (
+        '<div class="property entity" id="{id}">\n<h3>{id}</h3>\n<table>\n'
+        "<tr>\n<th>IRI</th>\n<td>\n<code>{iri}</code>\n</td>\n</tr>\n</table>\n</div>\n"
+    )
+    html = (
+        "<html><head></head><body>\n<div id=\"content\">\n"
+        + entity.format(id="one", iri="https://example.org/ns#first")
+        + entity.format(id="two", iri="https://example.org/ns/second")
+        + entity.format(id="first", iri="https://example.org/ns#primary")
+        + entity.format(id="three", iri="https://example.org/ns#a&amp;b")
+        + "<a href=\"#one\">not in the toc</a>\n</div>\n<div id=\"toc\">\n<ul>\n"
+        + "".join(
+            f'<li><a href="#{id}">{id}</a></li>\n' for id in ("one", "two", "three")
+        )
+        + "</ul>\n</div>\n</body></html>\n"
+    )
+    rewritten = ep.rewrite_property_anchors(html)
+
+    # ids follow the IRI fragment, toc links follow their div, nothing else changes
+    assert '<div class="property entity" id="primary">' in rewritten
+    assert '<div class="property entity" id="two">' in rewritten
+    assert '<div class="property entity" id="a&amp;b">' in rewritten
+    assert '<li><a href="#primary">one</a></li>' in rewritten
+    assert '<li><a href="#two">two</a></li>' in rewritten
+    assert '<li><a href="#a&amp;b">three</a></li>' in rewritten
+    assert '<a href="#one">not in the toc</a>' in rewritten
+    assert rewritten.count("\n") == html.count("\n")
+    assert ep.rewrite_property_anchors(rewritten) == rewritten
+    log.info("rewrite property anchors test passed successfully")
+
+
+def test_describedby_link(tmp_path):
+    enable_test_logging()
+    log.info("Testing the describedby link of the ontology pages")
+    link = '<link href="./onto.ttl" rel="describedby" type="text/turtle" />'
+    html = "<html><head><title>onto</title></head><body></body></html>"
+    linked = ep.add_describedby_link(html, "onto.ttl")
+    assert linked == html.replace("</head>", f"{link}</head>")
+    assert ep.add_describedby_link(linked, "onto.ttl") == linked
+
+    # added while publishing, once, however often the pages are published
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    for _ in range(2):
+        ontos = ep.publish_ontologies(
+            baseuri, str(nsfolder), str(outfolder), "templates", workers=1
+        )
+    for nskey in ontos:
+        name = Path(nskey).stem
+        link = f'<link href="./{name}.ttl" rel="describedby" type="text/turtle" />'
+        for page in (outfolder / f"{name}.html", outfolder / name / f"{name}.html"):
+            assert page.read_text().count(link) == 1, f"one link expected in {page}"
+    log.info("describedby link test passed successfully")
+
+
+def test_benchmark_anchors():
+    enable_test_logging()
+    log.info("Testing the anchors benchmark against the BeautifulSoup rewrite")
+    pytest.importorskip("bs4")
+    import benchmark
+
+    # run_anchors checks both rewrites give the same ids and hrefs
+    timings = benchmark.run_anchors(5, 20)
+    assert set(timings) == {"rewrite_property_anchors", "rewrite_property_anchors_bs4"}
+    log.info("benchmark anchors test passed successfully")
+
+
+def test_vocab_fragment_ids(tmp_path):
+    enable_test_logging()
+    log.info("Testing the normalised fragment ids in the vocabulary outputs")
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    nsfolder.mkdir()
+    (nsfolder / "labels.csv").write_text(
+        "ID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n"
+        'Top Level,2024-01-01,Top,the top,,,"[Some ""Thing""]"\n'
+        'Some "Thing",2024-01-01,Thing,a thing,,[Top Level],\n'
+    )
+    baseuri = "https://example.org/pylode2pages-test"
+    vocabs = ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+    assert not vocabs["./labels.csv"]["error"]
+
+    html = (outfolder / "labels_vocab.html").read_text()
+    assert '<div class="concept entity" id="topLevel">' in html
+    assert f"{baseuri}/labels_vocab#someThing</code" in html
+    assert '<a href="#someThing">Thing</a>' in html, "toc should link the new id"
+    assert '<a href="#topLevel">' in html, "broader should link the new id"
+    ttl = (outfolder / "labels_vocab.ttl").read_text()
+    assert f"<{baseuri}/labels#topLevel>" in ttl
+    assert f"<{baseuri}/labels#someThing>" in ttl
+    assert "#Top Level" not in ttl
+    log.info("vocab fragment ids test passed successfully")
+
+
+def test_rewrite_fragments():
+    enable_test_logging()
+    log.info("Testing the single pass rewrite of the vocabulary IRI fragments")
+    data = [{"ID": "Test One"}, {"ID": "two"}]
+    fragment_ids = dict()
+    validated, errors = ep.validate_csv_ids(data, True, fragment_ids)
+    assert not errors
+    assert fragment_ids == {"Test One": "testOne", "testOne": "testOne", "two": "two"}
+
+    base_iri = "https://example.org/ns/vocab#"
+    ttl = (
+        f"<{base_iri}Test One> a <{base_iri}testOne> .\n"
+        f"<{base_iri}two> <x> <{base_iri}Other Thing\n> .\n"
+        "<https://example.org/elsewhere#Keep This> .\n"
+    )
+    assert ep.rewrite_fragments(ttl, base_iri, fragment_ids) == (
+        f"<{base_iri}testOne> a <{base_iri}testOne> .\n"
+        f"<{base_iri}two> <x> <{base_iri}otherThing\n> .\n"
+        "<https://example.org/elsewhere#Keep This> .\n"
+    )
+    assert ep.rewrite_fragments(ttl, base_iri, fragment_ids, False).startswith(
+        f"<{base_iri}testOne> a"
+    )
+    log.info("rewrite fragments test passed successfully")
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_vocab_rows_streamed(tmp_path, monkeypatch, stream):
+    enable_test_logging()
+    log.info("Testing the vocabulary rendering from the streamed csv rows")
+    if stream:
+        monkeypatch.setattr(ep, "VOCAB_STREAM_SIZE", 0)
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    nsfolder.mkdir()
+    (nsfolder / "terms.csv").write_text(
+        "\ufeffID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n"
+        "one,2024-01-01,One,the first,,,\n"
+        "two,2024-01-01,Two,the second,,[one],\n"
+        ",2024-01-01,Nameless,no id,,,\n",
+        encoding="utf-8",
+    )
+    baseuri = "https://example.org/pylode2pages-test"
+    assert ep.vocab_generator("templates") is ep.vocab_generator("templates")
+    vocabs = ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+    assert not vocabs["./terms.csv"]["error"]
+
+    html = (outfolder / "terms_vocab.html").read_text()
+    assert html.count('<div class="concept entity"') == 2, "only valid rows are rendered"
+    assert html.count("</html>") == 1, "the template should be rendered once"
+    ttl = (outfolder / "terms_vocab.ttl").read_text()
+    assert f"<{baseuri}/terms#one>" in ttl
+    assert f"<{baseuri}/terms#two>" in ttl
+    assert "Nameless" not in ttl
+    assert "<dd>- One</dd>" in html, "broader concepts show their label"
+    log.info("vocab rows streamed test passed successfully")
+
+
+@pytest.mark.parametrize("page_size", [None, 3])
+def test_vocab_rows_stream_or_memory(tmp_path, page_size):
+    enable_test_logging()
+    log.info("Testing the streamed and in-memory vocabulary rows give the same output")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    baseuri = "https://example.org/pylode2pages-test"
+    outfolders = dict()
+    for stream in (True, False):
+        outfolder = tmp_path / f"stream-{stream}-out"
+        for csv_file in sorted(nsfolder.glob("*.csv")):
+            nspub = ep.vocabpub(
+                baseuri,
+                nsfolder,
+                Path("."),
+                csv_file.name,
+                outfolder,
+                "templates",
+                page_size=page_size,
+                stream=stream,
+            )
+            assert not nspub["error"], nspub.get("error_message")
+        outfolders[stream] = outfolder
+
+    published = sorted(
+        path.relative_to(outfolders[True])
+        for path in outfolders[True].rglob("*")
+        if path.is_file()
+    )
+    assert published == sorted(
+        path.relative_to(outfolders[False])
+        for path in outfolders[False].rglob("*")
+        if path.is_file()
+    )
+    for path in published:
+        assert (outfolders[True] / path).read_bytes() == (
+            outfolders[False] / path
+        ).read_bytes(), f"{path} should not depend on streaming the rows"
+    log.info("vocab rows stream or memory test passed successfully")
+
+
+def write_vocab_csv(path, concepts):
+    with open(path, "w", encoding="utf-8") as csvfile:
+        csvfile.write("ID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n")
+        for i in range(concepts):
+            broader = f"[Concept {(i - 1) // 4}]" if i else ""
+            csvfile.write(
+                f"Concept {i},2024-01-01,Concept {i},The concept number {i}.,,{broader},\n"
+            )
+
+
+def test_vocab_stream_memory_flat(tmp_path):
+    enable_test_logging()
+    log.info("Testing the memory use of a streamed vocabulary does not grow with it")
+    import tracemalloc
+
+    baseuri = "https://example.org/pylode2pages-test"
+    nsfolder = tmp_path / "in"
+    nsfolder.mkdir()
+    sizes = dict(warmup=10, small=500, large=2000)
+    for name, concepts in sizes.items():
+        write_vocab_csv(nsfolder / f"{name}.csv", concepts)
+
+    def peak(name, stream):
+        tracemalloc.start()
+        try:
+            nspub = ep.vocabpub(
+                baseuri,
+                nsfolder,
+                Path("."),
+                f"{name}.csv",
+                tmp_path / f"{name}-{stream}-out",
+                "templates",
+                page_size=50,
+                stream=stream,
+            )
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            assert not nspub["error"], nspub.get("error_message")
+
+    # the debug records of every row would be held by the log capture of pytest
+    level = ep.log.level
+    ep.log.setLevel(logging.INFO)
+    try:
+        # compile the templates before measuring
+        peak("warmup", True)
+        streamed = {name: peak(name, True) for name in ("small", "large")}
+        in_memory = {name: peak(name, False) for name in ("small", "large")}
+    finally:
+        ep.log.setLevel(level)
+    # four times the concepts: the rows kept in memory take about four times
+    # the memory, the streamed ones (nearly) no more than a page of them
+    assert in_memory["large"] > 3 * in_memory["small"]
+    assert streamed["large"] < 1.25 * streamed["small"]
+    log.info("vocab stream memory flat test passed successfully")
+
+
+def test_combine_ttls(tmp_path):
+    enable_test_logging()
+    log.info("Testing the streaming merge of the vocabulary ttl into the ontology ttl")
+    from rdflib import Graph
+
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    sources = ep.discover_sources(nsfolder)
+    ep.publish_ontologies(
+        baseuri, str(nsfolder), str(outfolder), "templates", sources=sources
+    )
+    ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates", sources=sources)
+
+    ttl_path = outfolder / "onto-two.ttl"
+    expected = Graph().parse(ttl_path, format="turtle")
+    expected.parse(outfolder / "onto-two_vocab.ttl", format="turtle")
+
+    combined = ep.combine_ttls(outfolder, sources, check=True, ntriples=True)
+    result = combined["onto-two.ttl"]
+    assert not result["error"]
+    # rdf and skos are declared alike by both, dc is a different namespace in each
+    assert result["dropped_prefixes"] == 2
+    assert not (outfolder / "onto-two_vocab.ttl").exists()
+    content = ttl_path.read_text()
+    assert content.count("PREFIX skos:") == 0
+    assert "PREFIX dc: <http://purl.org/dc/elements/1.1/>" in content
+    assert len(Graph().parse(ttl_path, format="turtle")) == len(expected)
+    assert len(Graph().parse(outfolder / "onto-two.nt", format="nt")) == len(expected)
+    # the same triples give the same N-Triples, blank nodes and all, and each
+    # part keeps its own blank nodes
+    bnodes_path = tmp_path / "bnodes.ttl"
+    bnodes_path.write_text(
+        "@prefix ex: <https://example.org/> .\nex:a ex:b [ ex:c [ ex:d 1 ] ] .\n"
+    )
+    nt_path = tmp_path / "bnodes.nt"
+    written = ep.output_stats()
+    ep.write_ntriples(nt_path, [bnodes_path, bnodes_path], written)
+    ep.write_ntriples(nt_path, [bnodes_path, bnodes_path], written)
+    assert written["changed"] == 1 and written["unchanged"] == 1
+    assert len(Graph().parse(nt_path, format="nt")) == 6
+
+    # a broken combined ttl is reported by the check
+    with open(ttl_path, "a") as ttl_file:
+        ttl_file.write("this is not turtle\n")
+    combined = ep.combine_ttls(outfolder, sources, check=True)
+    assert combined["onto-two.ttl"]["error"]
+    assert not combined["onto-one.ttl"]["error"]
+    log.info("combine ttls test passed successfully")
+
+
+def test_template_cache(monkeypatch, tmp_path):
+    enable_test_logging()
+    log.info("Testing the shared template registry and its bytecode cache")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    cache = outfolder / ".template-cache"
+    baseuri = "https://example.org/pylode2pages-test"
+    try:
+        ep.use_template_cache(str(cache))
+        assert ep.template_environment("templates") is ep.template_environment(
+            "templates"
+        )
+        assert ep.get_template("templates", "template_index.html") is ep.get_template(
+            "templates", "template_index.html"
+        ), "templates should be compiled once"
+        vocabs = ep.publish_vocabs(
+            baseuri, str(nsfolder), str(outfolder), "templates", workers=2
+        )
+        assert not any(vocab["error"] for vocab in vocabs.values())
+        cached = set(cache.glob("__jinja2_*.cache"))
+        # the index page and both vocabulary templates
+        assert len(cached) == 3, f"expected 3 compiled templates in cache, got {cached}"
+
+        # a next run loads them from the cache instead of compiling them
+        ep.use_template_cache(str(cache))
+        mtimes = {path: path.stat().st_mtime_ns for path in cached}
+        ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+        assert {path: path.stat().st_mtime_ns for path in cached} == mtimes
+
+        # a pysubyt version keeping its environment elsewhere goes without the cache
+        monkeypatch.setattr(ep, "JinjaBasedGenerator", lambda folder: object())
+        ep.use_template_cache(str(cache))
+        assert ep.vocab_generator("templates") is not None
+    finally:
+        ep.use_template_cache(None)
+    log.info("template cache test passed successfully")
+
+
+def test_ontology_pipeline(tmp_path):
+    enable_test_logging()
+    log.info("Testing the in-memory ontology pipeline")
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    nsfolder.mkdir()
+    plain = (
+        "@prefix owl: <http://www.w3.org/2002/07/owl#> .\n"
+        "@prefix dc: <http://purl.org/dc/terms/> .\n\n"
+        "<https://example.org/plain> a owl:Ontology ;\n"
+        '    dc:title "Plain" ;\n'
+        '    dc:modified "2024-01-01" .\n'
+    )
+    (nsfolder / "plain.ttl").write_text(plain)
+    (nsfolder / "broken.ttl").write_text("this is not turtle\n")
+    baseuri = "https://example.org/pylode2pages-test"
+
+    pub = ep.ontopub(baseuri, nsfolder, ".", "plain.ttl", outfolder)
+    assert not pub.get("error")
+    assert pub["title"] == "Plain"
+    assert pub["lastmod"] == "2024-01-01"
+    assert pub["type"] == "http://www.w3.org/2002/07/owl#Ontology"
+    assert (outfolder / "plain.ttl").read_text() == plain, "no template, no changes"
+    assert (outfolder / "plain.html").exists()
+
+    pub = ep.ontopub(baseuri, nsfolder, ".", "broken.ttl", outfolder)
+    assert pub["error"]
+    assert pub["error_message"].startswith("Unexpected error:")
+    assert not (outfolder / "broken.ttl").exists(), "only published once processed"
+    assert not ep.has_template_syntax(plain)
+    assert ep.has_template_syntax("<{{baseuri}}/{{name}}>")
+    log.info("ontology pipeline test passed successfully")
+
+
+def test_graph_cache(tmp_path, monkeypatch):
+    enable_test_logging()
+    log.info("Testing the persistent cache of parsed ontology graphs")
+    parent = Path(__file__).resolve().parent
+    cache = tmp_path / "graph-cache"
+    baseuri = "https://example.org/pylode2pages-test"
+    one, two = (
+        ep.Environment()
+        .from_string((parent / "new_in" / f"{name}.ttl").read_text())
+        .render(baseuri=baseuri, name=name)
+        for name in ("onto-one", "onto-two")
+    )
+    try:
+        ep.use_graph_cache(str(cache))
+        parsed = ep.parse_ontology(one, "file:///onto-one.ttl")
+        # pylode adds its inferences to the graph it renders, keep the parsed triples
+        triples = set(parsed)
+        entries = list(cache.glob("*.json"))
+        assert len(entries) == 1
+        assert json.loads(entries[0].read_text())["triples"], "plain json data"
+
+        # the next time the graph comes from the cache, without parsing turtle
+        def no_parsing(*args, **kwargs):
+            raise AssertionError("the cached graph should have been used")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(ep.Graph, "parse", no_parsing)
+            cached = ep.parse_ontology(one, "file:///onto-one.ttl")
+        assert set(cached) == triples
+        assert list(cached.namespaces()) == list(parsed.namespaces())
+        assert cached.identifier == parsed.identifier
+        assert ep.OntPub(cached).make_html() == ep.OntPub(parsed).make_html()
+
+        # an entry that is not json data is ignored, and replaced
+        entries[0].write_bytes(b"\x80\x04not json")
+        assert set(ep.parse_ontology(one, "file:///onto-one.ttl")) == triples
+        assert ep.graph_from_data(json.loads(entries[0].read_text()))
+
+        # the least recently used graph is evicted once the folder gets too big
+        ep.parse_ontology(two, "file:///onto-two.ttl")
+        entries = sorted(cache.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        assert len(entries) == 2
+        oldest, newest = entries
+        os.utime(oldest, (0, 0))
+        ep._graph_cache.max_size = (newest.stat().st_size + 1) / (1024 * 1024)
+        ep._graph_cache.evict()
+        assert list(cache.glob("*.json")) == [newest]
+    finally:
+        ep.use_graph_cache(None)
+    log.info("graph cache test passed successfully")
+
+
+def test_benchmark():
+    enable_test_logging()
+    log.info("Testing the benchmark on its tiny synthetic inputs")
+    import benchmark
+
+    results = benchmark.run_benchmark(["tiny"])
+    timings = results["sizes"]["tiny"]
+    stages = {
+        "publish_ontologies",
+        "publish_vocabs",
+        "publish_index_html",
+        "combine_ttls",
+        "add_describedby_link",
+        "rewrite_property_anchors",
+    }
+    # the BeautifulSoup rewrite is only compared with when bs4 is installed
+    assert set(timings) - {"rewrite_property_anchors_bs4"} == stages
+    assert benchmark.compare(results, results) == []
+    slower = dict(sizes=dict(tiny=dict(publish_vocabs=10.0)))
+    assert benchmark.compare(slower, results) == [
+        ("tiny", "publish_vocabs", timings["publish_vocabs"], 10.0)
+    ]
+    log.info("benchmark test passed successfully")
+
+
+def test_timing_report(tmp_path):
+    enable_test_logging()
+    log.info("Testing the per-stage timings and the timing report")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    ontos = ep.publish_ontologies(baseuri, str(nsfolder), str(outfolder), "templates")
+    vocabs = ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+
+    onto_stages = {"parse", "make_html", "rewrite_html", "copy", "backup", "render"}
+    assert onto_stages <= set(ontos["./onto-one.ttl"]["timings"])
+    vocab_stages = {"read_csv", "pysubyt_html", "pysubyt_ttl", "copy"}
+    assert vocab_stages <= set(vocabs["./onto-two.csv"]["timings"])
+    for spent in vocabs["./onto-two.csv"]["timings"].values():
+        assert spent["wall"] >= 0 and spent["cpu"] >= 0
+
+    report = ep.timing_report(ontos, vocabs)
+    assert set(report["files"]) == set(ontos) | set(vocabs)
+    parse = sum(
+        onto["timings"]["parse"]["wall"] for onto in ontos.values() if "timings" in onto
+    )
+    assert report["stages"]["parse"]["wall"] == pytest.approx(parse, abs=1e-3)
+    ep.save_timing_report(outfolder, report)
+    assert (outfolder / ep.TIMINGS_NAME).exists()
+    log.info("timing report test passed successfully")
+
+
+def test_memory_budget(tmp_path):
+    enable_test_logging()
+    log.info("Testing the memory tracking and the memory budget")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+
+    estimates = {"./small.ttl": 100, "./large.ttl": 900, "./medium.ttl": 300}
+    nskeys = sorted(estimates)
+    assert ep.plan_jobs(nskeys, estimates, 4) == (4, set())
+    # large goes on its own, only 2 workers fit the medium one in the budget
+    assert ep.plan_jobs(nskeys, estimates, 4, "800") == (2, {0})
+    assert ep.plan_jobs(nskeys, estimates, 4, 50) == (4, {0, 1, 2})
+
+    # a budget below any estimate isolates every input
+    ontos = ep.publish_ontologies(
+        baseuri, str(nsfolder), str(outfolder), "templates", memory_budget=1
+    )
+    vocabs = ep.publish_vocabs(
+        baseuri, str(nsfolder), str(outfolder), "templates", memory_budget=1
+    )
+    assert_result(baseuri, outfolder, ontos)
+    for nspub in list(ontos.values()) + list(vocabs.values()):
+        assert not nspub.get("error")
+        assert nspub["memory"]["isolated"]
+        assert nspub["memory"]["estimate"] >= ep.MEMORY_BASE
+        assert nspub["memory"]["peak_rss"] > 0
+    log.info("memory budget test passed successfully")
+
+
+def test_watch(tmp_path, monkeypatch):
+    enable_test_logging()
+    log.info("Testing the watch mode rebuilds and serves the changed inputs")
+    parent = Path(__file__).resolve().parent
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    shutil.copytree(parent / "new_in", nsfolder)
+    baseuri = "https://example.org/pylode2pages-test"
+
+    servers = []
+    serve = ep.serve
+
+    def keep_server(*args):
+        servers.append(serve(*args))
+        return servers[-1]
+
+    monkeypatch.setattr(ep, "serve", keep_server)
+
+    def mtimes():
+        return {
+            path.name: path.stat().st_mtime_ns
+            for path in outfolder.glob("*.html")
+            if path.name != "index.html"
+        }
+
+    polls = []
+
+    def edit_between_polls(seconds):
+        polls.append(mtimes())
+        if len(polls) == 1:
+            port = servers[0].server_port
+            with urlopen(f"http://127.0.0.1:{port}/index.html") as response:
+                assert b"onto-two" in response.read()
+            with open(nsfolder / "onto-two.csv", "a") as csvfile:
+                csvfile.write("5,2024-01-01,Leg,a limb,,[4],\n")
+
+    monkeypatch.setattr(ep.time, "sleep", edit_between_polls)
+    ep.watch([baseuri, str(nsfolder), str(outfolder)], port=0, rounds=2)
+
+    # only the changed vocabulary (and its ontology) were published again,
+    # of which only the vocabulary page changed
+    first, second = polls
+    changed = {name for name, mtime in second.items() if first[name] != mtime}
+    assert changed == {"onto-two_vocab.html"}
+    assert "Leg" in (outfolder / "onto-two_vocab.html").read_text()
+    log.info("watch test passed successfully")
+
+
+def test_watch_failed_rebuild(tmp_path):
+    enable_test_logging()
+    log.info("Testing a rebuild after a broken ontology publishes its pair again")
+    parent = Path(__file__).resolve().parent
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    shutil.copytree(parent / "new_in", nsfolder)
+    baseuri = "https://example.org/pylode2pages-test"
+    inputs = ep.read_inputs([baseuri, str(nsfolder), str(outfolder)])
+    template_path, manifest = ep.prepare_build(inputs)
+
+    def concepts():
+        graph = Graph().parse(outfolder / "onto-two.ttl", format="turtle")
+        return len(set(graph.subjects(RDF.type, SKOS.Concept)))
+
+    # the manifest is kept in memory between the rebuilds, as watch does
+    assert ep.rebuild(inputs, template_path, manifest) is not None
+    published = concepts()
+    assert published > 0
+    source = (nsfolder / "onto-two.ttl").read_text()
+    (nsfolder / "onto-two.ttl").write_text(source + "\nthis is not turtle\n")
+    assert ep.rebuild(inputs, template_path, manifest) is None
+    assert not any(key.startswith("./onto-two") for key in manifest["inputs"])
+    (nsfolder / "onto-two.ttl").write_text(source)
+    assert ep.rebuild(inputs, template_path, manifest) is not None
+    assert concepts() == published, "the vocabulary is merged in again"
+    log.info("watch failed rebuild test passed successfully")
+
+
+def test_precompress(tmp_path):
+    enable_test_logging()
+    log.info("Testing the precompressed siblings of the html and ttl outputs")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    ep.publish_ontologies(baseuri, str(nsfolder), str(outfolder), "templates")
+    ep.combine_ttls(str(outfolder))
+
+    compressed = ep.precompress(str(outfolder), workers=2)
+    assert "onto-one.html" in compressed and "onto-one.ttl" in compressed
+    for key, result in compressed.items():
+        assert not result["error"] and result["written"] == list(
+            ep.compressed_siblings()
+        )
+        path = outfolder / key
+        assert gzip.decompress(Path(f"{path}.gz").read_bytes()) == path.read_bytes()
+        assert result[".gz"] < result["size"]
+        if ep.brotli is not None:
+            brotlied = Path(f"{path}.br").read_bytes()
+            assert ep.brotli.decompress(brotlied) == path.read_bytes()
+
+    # up to date siblings are kept, a changed file gets compressed again
+    html = outfolder / "onto-one.html"
+    html.write_text(html.read_text() + "<!-- changed -->")
+    mtime = Path(f"{html}.gz").stat().st_mtime_ns + 10**9
+    os.utime(html, ns=(mtime, mtime))
+    compressed = ep.precompress(str(outfolder))
+    written = [key for key, result in compressed.items() if result["written"]]
+    assert written == ["onto-one.html"]
+    assert gzip.decompress(Path(f"{html}.gz").read_bytes()).endswith(b"<!-- changed -->")
+    log.info("precompress test passed successfully")
+
+
+def test_vocab_pages(tmp_path):
+    enable_test_logging()
+    log.info("Testing large vocabularies are spread over pages")
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    nsfolder.mkdir()
+    (nsfolder / "terms.csv").write_text(
+        "ID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n"
+        "one,2024-01-01,One,the first,,,[two;three]\n"
+        "two,2024-01-01,Two,the second,,[one],\n"
+        "three,2024-01-01,Three,the third,,[one],[four]\n"
+        "four,2024-01-01,Four,the fourth,,[three],\n"
+        "five,2024-01-01,Five,the fifth,,,\n",
+        encoding="utf-8",
+    )
+    baseuri = "https://example.org/pylode2pages-test"
+    vocabs = ep.publish_vocabs(
+        baseuri, str(nsfolder), str(outfolder), "templates", page_size=2
+    )
+    assert not vocabs["./terms.csv"]["error"]
+    assert vocabs["./terms.csv"]["pages"] == 3
+
+    folder = outfolder / "terms"
+    toc = json.loads((folder / "terms_vocab-toc.json").read_text())
+    assert toc["pages"] == [f"terms_vocab-{n}.html" for n in (1, 2, 3)]
+    assert toc["concepts"][2] == ["three", "Three", 1]
+
+    first = (folder / "terms_vocab-1.html").read_text()
+    assert first.count('<div class="concept entity"') == 2
+    # links to concepts on other pages go to that page
+    assert 'href="terms_vocab-2.html#three"' in first
+    assert 'href="terms_vocab-2.html">next' in first
+
+    # the landing pages list the pages, relative to where they are
+    landing = (folder / "terms_vocab.html").read_text()
+    assert '<div class="concept entity"' not in landing
+    assert 'href="terms_vocab-3.html"' in landing
+    root = (outfolder / "terms_vocab.html").read_text()
+    assert 'href="terms/terms_vocab-3.html"' in root
+
+    # below the page size the vocabulary is one page again
+    vocabs = ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+    assert vocabs["./terms.csv"]["pages"] == 1
+    assert not list(folder.glob("terms_vocab-*"))
+    assert (folder / "terms_vocab.html").read_text().count("concept entity") == 5
+    log.info("vocab pages test passed successfully")
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_hierarchy_resolver(tmp_path, monkeypatch, stream):
+    enable_test_logging()
+    log.info("Testing broader and narrower concepts are resolved in python")
+    assert ep.parse_hierarchy("[1; 2;]") == ["1", "2"]
+    assert ep.parse_hierarchy("3") == ["3"]
+    assert ep.parse_hierarchy("") == []
+
+    base_iri = "https://example.org/terms#"
+    resolve = ep.hierarchy_resolver(
+        base_iri, {"a b": "a_b"}, {"a b": "A b"}, {"a_b": "terms_vocab-2.html"}
+    )
+    row = resolve(dict(BROADER="[a b;https://example.org/other#x]", NARROWER=""))
+    assert row["narrower"] == []
+    assert row["broader"] == [
+        dict(
+            iri=f"{base_iri}a_b",
+            href="terms_vocab-2.html#a_b",
+            label="A b",
+            external=False,
+        ),
+        dict(
+            iri="https://example.org/other#x",
+            href="https://example.org/other#x",
+            label=None,
+            external=True,
+        ),
+    ]
+
+    if stream:
+        monkeypatch.setattr(ep, "VOCAB_STREAM_SIZE", 0)
+    nsfolder = tmp_path / "in"
+    outfolder = tmp_path / "out"
+    nsfolder.mkdir()
+    (nsfolder / "terms.csv").write_text(
+        "ID,DATE,PREFLABEL_EN,DEFINITION_EN,ALTLABEL_EN,BROADER,NARROWER\n"
+        "one,2024-01-01,One,the first,,,[two;nine]\n"
+        "two,2024-01-01,Two,the second,second,one,\n",
+        encoding="utf-8",
+    )
+    # the dangling reference to 'nine' is only warned about
+    vocabs = ep.publish_vocabs(
+        "https://example.org/pylode2pages-test",
+        str(nsfolder),
+        str(outfolder),
+        "templates",
+    )
+    assert not vocabs["./terms.csv"]["error"]
+
+    ttl = (outfolder / "terms_vocab.ttl").read_text()
+    # concepts without narrower concepts keep their definition and altLabel
+    assert "'the second'@en" in ttl
+    assert "'second'@en" in ttl
+    assert "skos:broader           <https://example.org/pylode2pages-test/terms#one>" in ttl
+    log.info("hierarchy resolver test passed successfully")
+
+
+def test_search_index(tmp_path):
+    enable_test_logging()
+    log.info("Testing the search index of the terms on all published pages")
+    parent = Path(__file__).resolve().parent
+    nsfolder = parent / "new_in"
+    outfolder = tmp_path / "out"
+    baseuri = "https://example.org/pylode2pages-test"
+    ontos = ep.publish_ontologies(baseuri, str(nsfolder), str(outfolder), "templates")
+    vocabs = ep.publish_vocabs(baseuri, str(nsfolder), str(outfolder), "templates")
+    ep.publish_search_index(outfolder, ontos, vocabs)
+
+    search_index = json.loads((outfolder / ep.SEARCH_INDEX_NAME).read_text())
+    docs = {doc[2]: doc for doc in search_index["docs"]}
+    concept = docs[f"{baseuri}/onto-two#1"]
+    assert concept[:2] == ["Abdominal pain", "onto-two_vocab.html#1"]
+    assert concept[3].startswith("Pain in the region of the abdomen")
+    term = docs[f"{baseuri}/onto-one#CClass1"]
+    assert term[1] == "onto-one.html#CClass1"
+    assert 'id="CClass1"' in (outfolder / "onto-one.html").read_text()
+    assert docs[f"{baseuri}/onto-one"][1] == "onto-one.html"
+
+    # words of the labels, fragments and definitions point to their terms
+    ids = [doc[2] for doc in search_index["docs"]]
+    assert ids.index(f"{baseuri}/onto-two#1") in search_index["index"]["abdominal"]
+    assert ids.index(f"{baseuri}/onto-two#1") in search_index["index"]["abdomen"]
+    assert ep.search_tokens("Test Onto #01", None) == {"test", "onto", "01"}
+
+    # the entries written one by one are plain compact json
+    text = ep.search_entries_path(outfolder, ".", "onto-two.csv").read_text()
+    compact = json.dumps(json.loads(text), ensure_ascii=False, separators=(",", ":"))
+    assert text == compact
+    empty = outfolder / "empty.json"
+    ep.save_search_entries(empty, iter([]))
+    assert json.loads(empty.read_text()) == []
+    log.info("search index test passed successfully")
+
+
 if __name__ == "__main__":
     run_single_test(__file__)